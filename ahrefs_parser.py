@@ -5,13 +5,15 @@ Parses Ahrefs Batch Analysis CSV and merges with scraped/SERP data.
 
 import csv
 import re
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, FrozenSet, List, Optional, Tuple
 from urllib.parse import urlparse
 
 PROJECT_ROOT = Path(__file__).parent.resolve()
 DATA_DIR = PROJECT_ROOT / "data"
 AHREFS_CSV = DATA_DIR / "ahrefs_batch.csv"
+CSV_BUFFER_SIZE = 1 << 20  # 1 MB read buffer; Ahrefs exports can run to tens of MB
 
 # Common Ahrefs column name variations (case-insensitive)
 AHREFS_COLUMN_ALIASES = {
@@ -22,14 +24,22 @@ AHREFS_COLUMN_ALIASES = {
     "organic traffic": ["organic traffic", "traffic", "est. traffic"],
 }
 
+# Already-normalized URL: lowercase https, no www., no query/fragment, no trailing slash (except root)
+_CANONICAL_URL_RE = re.compile(r"https://(?!www\.)[a-z0-9.-]+(?::\d+)?(?:/|(?:/[-a-z0-9._~%!$&'()*+,=:@]+)+)")
 
+
+@lru_cache(maxsize=4096)
 def _normalize_url_for_match(url: str) -> str:
     """
     Normalize URL for matching: lowercase, no trailing slash, https, no www.
     """
     if not url or not url.strip():
         return ""
-    url = url.strip().lower()
+    url = url.strip()
+    # Fast path: most Ahrefs exports are already canonical, skip urlparse
+    if _CANONICAL_URL_RE.fullmatch(url):
+        return url
+    url = url.lower()
     if url.startswith("//"):
         url = "https:" + url
     elif not url.startswith(("http://", "https://")):
@@ -42,8 +52,9 @@ def _normalize_url_for_match(url: str) -> str:
     return f"https://{netloc}{path}"
 
 
-def _url_variants(url: str) -> Set[str]:
-    """Generate URL variants for flexible matching."""
+@lru_cache(maxsize=4096)
+def _url_variants_frozen(url: str) -> FrozenSet[str]:
+    """Generate URL variants for flexible matching. Cached; callers must not mutate."""
     normalized = _normalize_url_for_match(url)
     variants = {normalized}
     parsed = urlparse(normalized)
@@ -64,41 +75,76 @@ def _url_variants(url: str) -> Set[str]:
     path_lower = path.lower()
     if path_lower != path:
         variants.add(f"https://{netloc}{path_lower}")
-    return variants
+    return frozenset(variants)
 
 
-def _find_column(header_row: List[str], *names: str) -> Optional[int]:
-    """Find column index by possible names (case-insensitive)."""
+def _header_map(header_row: List[str]) -> Dict[str, int]:
+    """Map normalized header name -> first column index."""
+    hmap = {}
     for i, col in enumerate(header_row):
-        col_lower = col.strip().lower()
+        hmap.setdefault(col.strip().lower(), i)
+    return hmap
+
+
+def _find_column(hmap: Dict[str, int], *names: str) -> Optional[int]:
+    """Find column index by possible names (case-insensitive): exact header match first, then substring."""
+    for name in names:
+        idx = hmap.get(name)
+        if idx is not None:
+            return idx
+    for col_lower, i in hmap.items():
         for name in names:
             if name in col_lower or col_lower in name:
                 return i
     return None
 
 
-def parse_ahrefs_csv() -> Optional[Dict[str, dict]]:
+def looks_like_ahrefs_header(sample: bytes) -> bool:
+    """
+    Check the start of an uploaded file: its first CSV row must name a URL column
+    and at least one Ahrefs metric column. Used to reject bogus uploads before a run.
+    """
+    text = sample.decode("utf-8-sig", errors="replace")
+    first_line = text.splitlines()[0] if text else ""
+    header = next(csv.reader([first_line]), [])
+    hmap = {k: i for k, i in _header_map(header).items() if k}
+    if not hmap:
+        return False
+    url_col = _find_column(hmap, "url", "address", "target", "page")
+    if url_col is None:
+        return False
+    # Substring matching lets "ur" hit the URL column itself, so a metric must be a different column
+    return any(
+        _find_column(hmap, *aliases) not in (None, url_col) for aliases in AHREFS_COLUMN_ALIASES.values()
+    )
+
+
+def parse_ahrefs_csv() -> Optional[Tuple[Dict[str, dict], Dict[str, str]]]:
     """
     Parse ahrefs_batch.csv.
-    Returns dict mapping normalized URL -> {dr, ur, referring_domains, backlinks, organic_traffic}
+    Returns (canonical_map, variant_aliases):
+      canonical_map: normalized URL -> {dr, ur, referring_domains, backlinks, organic_traffic}
+      variant_aliases: URL variant (www/slash/http) -> normalized URL key in canonical_map
     or None if file does not exist.
     """
     if not AHREFS_CSV.exists():
         return None
 
     url_to_data = {}
-    with open(AHREFS_CSV, "r", encoding="utf-8", errors="replace") as f:
+    variant_aliases = {}
+    with open(AHREFS_CSV, "r", encoding="utf-8", errors="replace", newline="", buffering=CSV_BUFFER_SIZE) as f:
         reader = csv.reader(f)
         header = next(reader, [])
         if not header:
-            return url_to_data
+            return url_to_data, variant_aliases
 
-        url_col = _find_column(header, "url", "address", "target", "page")
-        dr_col = _find_column(header, "domain rating", "dr")
-        ur_col = _find_column(header, "url rating", "ur")
-        rd_col = _find_column(header, "referring domains", "refdomains")
-        bl_col = _find_column(header, "backlinks", "links")
-        traffic_col = _find_column(header, "organic traffic", "traffic")
+        hmap = _header_map(header)
+        url_col = _find_column(hmap, "url", "address", "target", "page")
+        dr_col = _find_column(hmap, "domain rating", "dr")
+        ur_col = _find_column(hmap, "url rating", "ur")
+        rd_col = _find_column(hmap, "referring domains", "refdomains")
+        bl_col = _find_column(hmap, "backlinks", "links")
+        traffic_col = _find_column(hmap, "organic traffic", "traffic")
 
         if url_col is None:
             # First column might be URL
@@ -110,7 +156,6 @@ def parse_ahrefs_csv() -> Optional[Dict[str, dict]]:
             url = row[url_col].strip()
             if not url or url.startswith("#"):
                 continue
-            key = _normalize_url_for_match(url)
             entry = {
                 "domain_rating": "Not available" if dr_col is None else _safe_val(row, dr_col),
                 "url_rating": "Not available" if ur_col is None else _safe_val(row, ur_col),
@@ -118,12 +163,14 @@ def parse_ahrefs_csv() -> Optional[Dict[str, dict]]:
                 "backlinks": "Not available" if bl_col is None else _safe_val(row, bl_col),
                 "organic_traffic": "Not available" if traffic_col is None else _safe_val(row, traffic_col),
             }
+            # One entry per normalized URL; variants only point at its key
+            key = _normalize_url_for_match(url)
             url_to_data[key] = entry
-            # Also store variants for lookup
-            for v in _url_variants(url):
-                url_to_data[v] = entry
+            for v in _url_variants_frozen(url):
+                if v != key:
+                    variant_aliases[v] = key
 
-    return url_to_data
+    return url_to_data, variant_aliases
 
 
 def _safe_val(row: list, idx: int) -> str:
@@ -134,17 +181,29 @@ def _safe_val(row: list, idx: int) -> str:
     return val if val else "Not available"
 
 
-def match_url_to_ahrefs(url: str, ahrefs_map: Dict[str, dict]) -> Tuple[Optional[dict], bool]:
+def match_url_to_ahrefs(
+    url: str,
+    ahrefs_map: Dict[str, dict],
+    variant_aliases: Optional[Dict[str, str]] = None,
+) -> Tuple[Optional[dict], bool]:
     """
     Match a URL to Ahrefs data.
     Returns (ahrefs_data, matched).
     """
     if not ahrefs_map:
         return None, False
-    variants = _url_variants(url)
-    for v in variants:
+    # Canonical keys are normalized the same way, so this almost always hits
+    hit = ahrefs_map.get(_normalize_url_for_match(url))
+    if hit is not None:
+        return hit, True
+    aliases = variant_aliases or {}
+    # Miss: fall back to the (lru-cached) variants of the URL
+    for v in _url_variants_frozen(url):
         if v in ahrefs_map:
             return ahrefs_map[v], True
+        key = aliases.get(v)
+        if key is not None:
+            return ahrefs_map[key], True
     return None, False
 
 
@@ -162,13 +221,14 @@ def merge_ahrefs_data(
     for sp in scraped_pages:
         pages.append(dict(sp))
 
-    ahrefs_map = parse_ahrefs_csv()
-    if ahrefs_map is None:
+    parsed = parse_ahrefs_csv()
+    if parsed is None:
         print("No Ahrefs data found — drop ahrefs_batch.csv into the data folder and rerun with --skip-scrape to add authority data without re-scraping.")
     else:
+        ahrefs_map, variant_aliases = parsed
         for p in pages:
             url = p.get("url", "")
-            data, matched = match_url_to_ahrefs(url, ahrefs_map)
+            data, matched = match_url_to_ahrefs(url, ahrefs_map, variant_aliases)
             p["ahrefs_matched"] = matched
             if matched and data:
                 p["domain_rating"] = data.get("domain_rating", "Not available")
@@ -4,10 +4,18 @@ Page type classification, content coverage, section order, authority vs content
 """
 
 import re
+from collections import Counter
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional, Pattern
 from urllib.parse import urlparse
 
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
+
+try:
+    import ahocorasick  # optional: pip install pyahocorasick
+except ImportError:
+    ahocorasick = None
 
 PROJECT_ROOT = Path(__file__).parent.resolve()
 
@@ -40,26 +48,46 @@ ELEMENT_WEIGHTS = {
     "google_review_widget": 0.5,
     "video_testimonials": 0.6,
 }
+_ELEMENT_WEIGHT_ITEMS = tuple(ELEMENT_WEIGHTS.items())
+_ELEMENT_TOTAL_WEIGHT = sum(ELEMENT_WEIGHTS.values())
+
+# Compiled once; used per SERP result / per page
+_DATE_RE = re.compile(r"/\d{4}/|\d{4}-\d{2}|/\d{2}-\d{2}-\d{4}/|/[a-z]{3}-\d{4}/")
+_LEADING_YEAR_RE = re.compile(r"^\d{4}")
+_NUM_RE = re.compile(r"(\d+(?:\.\d+)?)")
+
+
+def _fast_path(url: str) -> str:
+    """Path component of an absolute http(s) URL without a full urlparse; same result as urlparse(url).path."""
+    i = url.find("://")
+    # Unusual input (params, whitespace/control chars, odd scheme) goes through urlparse
+    if i <= 0 or ";" in url or not url[:i].isalnum() or not url.isprintable() or url != url.strip():
+        return urlparse(url).path
+    j = url.find("/", i + 3)
+    if j < 0:
+        return ""
+    end = len(url)
+    for sep in ("?", "#"):
+        k = url.find(sep, i + 3, end)
+        if k >= 0:
+            end = k
+    return url[j:end] if j < end else ""
 
 
 def _get_path_segments(url: str) -> list[str]:
     """Extract path segments from URL."""
-    parsed = urlparse(url)
-    path = parsed.path.strip("/")
+    path = _fast_path(url).strip("/")
     return [s for s in path.split("/") if s] if path else []
 
 
-def _path_contains_any(url: str, patterns: list[str]) -> bool:
-    """Check if URL path contains any of the patterns."""
-    path = urlparse(url).path.lower()
-    return any(p.lower() in path for p in patterns)
+def _path_contains_any_lower(path_lower: str, patterns_lower: list[str]) -> bool:
+    """Check if an already-lowercased path contains any of the lowercased patterns."""
+    return any(p in path_lower for p in patterns_lower)
 
 
-def _path_has_date_pattern(path: str) -> bool:
-    """Check for date-like patterns in path (e.g. /2024/01/, /jan-2024/)."""
-    return bool(re.search(r"/\d{4}/|\d{4}-\d{2}|/\d{2}-\d{2}-\d{4}/|/[a-z]{3}-\d{4}/", path.lower())) or bool(
-        re.search(r"^\d{4}", path)
-    )
+def _path_has_date_pattern(path_lower: str) -> bool:
+    """Check for date-like patterns in a lowercased path (e.g. /2024/01/, /jan-2024/)."""
+    return bool(_DATE_RE.search(path_lower)) or bool(_LEADING_YEAR_RE.search(path_lower))
 
 
 def classify_url_pre_scrape(serp_results: list[dict], config: dict) -> list[dict]:
@@ -68,12 +96,14 @@ def classify_url_pre_scrape(serp_results: list[dict], config: dict) -> list[dict
     Adds page_type_prelim and confidence_prelim to each result.
     """
     pc = config.get("page_classification", {})
-    location_patterns = pc.get("location_folder_patterns", ["/locations/", "/offices/", "/clinics/"])
+    location_patterns = [
+        p.lower() for p in pc.get("location_folder_patterns", ["/locations/", "/offices/", "/clinics/"])
+    ]
     procedure = config.get("procedure", "").lower()
 
     for row in serp_results:
         url = row.get("url", "")
-        path = urlparse(url).path
+        path = _fast_path(url)
         path_lower = path.lower()
         segments = _get_path_segments(url)
 
@@ -85,14 +115,14 @@ def classify_url_pre_scrape(serp_results: list[dict], config: dict) -> list[dict
             continue
 
         # Blog/Article
-        if "/blog/" in path_lower or "/news/" in path_lower or "/articles/" in path_lower or _path_has_date_pattern(path):
+        if "/blog/" in path_lower or "/news/" in path_lower or "/articles/" in path_lower or _path_has_date_pattern(path_lower):
             row["page_type_prelim"] = "Blog/Article"
             row["confidence_prelim"] = "High"
             row["url_signal"] = "Blog/news/date pattern"
             continue
 
         # Geo Page preliminary: location folder or city as primary path
-        if _path_contains_any(url, location_patterns):
+        if _path_contains_any_lower(path_lower, location_patterns):
             row["page_type_prelim"] = "Geo Page"
             row["confidence_prelim"] = "Medium"
             row["url_signal"] = "Location folder in path"
@@ -122,14 +152,63 @@ def classify_url_pre_scrape(serp_results: list[dict], config: dict) -> list[dict
     return serp_results
 
 
+@lru_cache(maxsize=32)
+def _signal_pattern(signals: tuple[str, ...]) -> Optional[Pattern]:
+    """Single alternation regex over a signal list (compiled once per config)."""
+    if not signals:
+        return None
+    return re.compile("|".join(map(re.escape, signals)))
+
+
+# Below this many signals the regex pre-check + substring loop is as fast as an automaton
+AHOCORASICK_MIN_SIGNALS = 8
+
+
+@lru_cache(maxsize=32)
+def _signal_automaton(signals: tuple[str, ...]):
+    """Aho-Corasick automaton over a signal list, or None if unavailable/not worth it."""
+    if ahocorasick is None or len(signals) < AHOCORASICK_MIN_SIGNALS or "" in signals:
+        return None
+    auto = ahocorasick.Automaton()
+    for s in signals:
+        auto.add_word(s, s)
+    auto.make_automaton()
+    return auto
+
+
+@lru_cache(maxsize=32)
+def _signal_initials(signals: tuple[str, ...]) -> Optional[frozenset]:
+    """First characters of the signals, or None if an empty signal makes every text match."""
+    if "" in signals:
+        return None
+    return frozenset(s[0] for s in signals)
+
+
+def _matched_signals(signals: tuple[str, ...], *texts: str) -> set[str]:
+    """Return the signals that occur in any of the texts."""
+    initials = _signal_initials(signals)
+    # Cheap reject: no text contains a single signal's first character (e.g. empty/short pages)
+    if initials is not None and all(initials.isdisjoint(t) for t in texts):
+        return set()
+    auto = _signal_automaton(signals)
+    if auto is not None:
+        # Single linear scan per text finds every (overlapping) signal hit
+        return {s for t in texts for _, s in auto.iter(t)}
+    pattern = _signal_pattern(signals)
+    # One C-level scan rejects the common no-signal case
+    if pattern is None or not any(pattern.search(t) for t in texts):
+        return set()
+    return {s for s in signals if any(s in t for t in texts)}
+
+
 def classify_pages_post_scrape(scraped_pages: list[dict], config: dict) -> list[dict]:
     """
     Content-based classification. Overrides URL signals when they conflict.
     Content signals always win.
     """
     pc = config.get("page_classification", {})
-    geo_signals = [s.lower() for s in pc.get("geo_page_signals", [])]
-    proc_signals = [s.lower() for s in pc.get("procedure_location_signals", [])]
+    geo_signals = tuple(s.lower() for s in pc.get("geo_page_signals", []))
+    proc_signals = tuple(s.lower() for s in pc.get("procedure_location_signals", []))
     procedure = config.get("procedure", "").lower()
 
     for p in scraped_pages:
@@ -148,43 +227,42 @@ def classify_pages_post_scrape(scraped_pages: list[dict], config: dict) -> list[
         final_type = prelim
         confidence = p.get("confidence_prelim", "Medium")
 
+        geo_in_text = _matched_signals(geo_signals, visible_text)
+        geo_hits = geo_in_text | _matched_signals(geo_signals, h2_texts)
+        proc_hits = _matched_signals(proc_signals, visible_text)
+
         # Content: H1 leads with city + multiple procedures = Geo Page
         if h1 and word_count < 400:
             # Short page with city-first H1
             if any(c in h1 for c in ["dallas", "chicago", "location", "office", "our"]):
-                for g in geo_signals:
-                    if g in visible_text:
-                        final_type = "Geo Page"
-                        content_signal = "City H1 + geo signals"
-                        confidence = "High"
-                        break
-
-        # Content: section listing multiple procedures = Geo Page
-        for g in geo_signals:
-            if g in visible_text or g in h2_texts:
-                # Check if page lists multiple procedures
-                proc_count = sum(1 for s in proc_signals if s in visible_text)
-                proc_term = procedure.lower() if procedure else ""
-                if proc_count < 2 and not (proc_term and proc_term in visible_text):
-                    # Actually could be geo - multiple services
+                if geo_in_text:
                     final_type = "Geo Page"
-                    content_signal = f"Geo signal: {g}"
+                    content_signal = "City H1 + geo signals"
                     confidence = "High"
-                break
+
+        # Content: section listing multiple procedures = Geo Page
+        g = next((g for g in geo_signals if g in geo_hits), None)
+        if g is not None:
+            # Check if page lists multiple procedures
+            proc_count = len(proc_hits)
+            if proc_count < 2 and not (procedure and procedure in visible_text):
+                # Actually could be geo - multiple services
+                final_type = "Geo Page"
+                content_signal = f"Geo signal: {g}"
+                confidence = "High"
 
         # Content: clinical detail for single procedure = Service or Procedure+Location
-        for sig in proc_signals:
-            if sig in visible_text:
-                if prelim == "Geo Page":
-                    # Override: content says procedure page
-                    final_type = "Procedure+Location" if "location" in h1 or len(structure.get("h2s", [])) > 4 else "Service Page"
-                    content_signal = f"Procedure signal: {sig}"
-                    confidence = "High"
-                break
+        sig = next((s for s in proc_signals if s in proc_hits), None)
+        if sig is not None:
+            if prelim == "Geo Page":
+                # Override: content says procedure page
+                final_type = "Procedure+Location" if "location" in h1 or len(structure.get("h2s", [])) > 4 else "Service Page"
+                content_signal = f"Procedure signal: {sig}"
+                confidence = "High"
 
         # H1 leads with procedure + clinical content
         if procedure and procedure in h1:
-            if any(s in visible_text for s in proc_signals):
+            if proc_hits:
                 if prelim in ("Geo Page", "Homepage"):
                     final_type = "Procedure+Location" if prelim == "Geo Page" else "Service Page"
                     content_signal = "Procedure H1 + clinical content"
@@ -199,19 +277,20 @@ def classify_pages_post_scrape(scraped_pages: list[dict], config: dict) -> list[
 
 
 def _get_page_text_for_classification(page: dict) -> str:
-    """Get combined text for content classification."""
-    parts = []
+    """Get combined lowercased text for content classification."""
     structure = page.get("structure", {})
-    parts.append(structure.get("h1", ""))
-    for h2 in structure.get("h2s", []):
-        parts.append(h2.get("text", ""))
-        parts.extend(h2.get("h3s", []))
-    # Content elements may have text
-    ce = page.get("content_elements", {})
-    sc = ce.get("surgeon_credentials", {})
-    if isinstance(sc, dict):
-        parts.append(sc.get("exact_text", ""))
-    return " ".join(str(p) for p in parts).lower()
+
+    def _parts():
+        yield structure.get("h1", "")
+        for h2 in structure.get("h2s", []):
+            yield h2.get("text", "")
+            yield from h2.get("h3s", [])
+        # Content elements may have text
+        sc = page.get("content_elements", {}).get("surgeon_credentials", {})
+        if isinstance(sc, dict):
+            yield sc.get("exact_text", "")
+
+    return " ".join(str(p) for p in _parts()).lower()
 
 
 def _safe_dr(page: dict) -> float:
@@ -220,7 +299,7 @@ def _safe_dr(page: dict) -> float:
     if isinstance(dr, (int, float)):
         return float(dr)
     if isinstance(dr, str):
-        m = re.search(r"(\d+(?:\.\d+)?)", str(dr))
+        m = _NUM_RE.search(dr)
         return float(m.group(1)) if m else 0
     return 0
 
@@ -231,7 +310,7 @@ def _safe_ur(page: dict) -> float:
     if isinstance(ur, (int, float)):
         return float(ur)
     if isinstance(ur, str):
-        m = re.search(r"(\d+(?:\.\d+)?)", str(ur))
+        m = _NUM_RE.search(ur)
         return float(m.group(1)) if m else 0
     return 0
 
@@ -294,15 +373,15 @@ def _compute_content_richness_score(page: dict) -> float:
     ce = page.get("content_elements", {})
     if not ce:
         return 0
-    score = 0
-    total_weight = sum(ELEMENT_WEIGHTS.values())
-    for key, weight in ELEMENT_WEIGHTS.items():
-        el = ce.get(key, {})
-        if isinstance(el, dict) and el.get("present"):
-            score += weight
-        elif isinstance(el, bool) and el:
-            score += weight
-    return min(10, round(score / (total_weight / 10), 1))
+    score = sum(weight for key, weight in _ELEMENT_WEIGHT_ITEMS if _element_present(ce.get(key)))
+    return min(10, round(score / (_ELEMENT_TOTAL_WEIGHT / 10), 1))
+
+
+def _element_present(el) -> bool:
+    """Content element counts as present if its dict says so, or it is literally True."""
+    if isinstance(el, dict):
+        return bool(el.get("present"))
+    return el is True
 
 
 def _diagnose_page(dr: float, score: float) -> str:
@@ -391,28 +470,31 @@ def run_analysis(merged_data: dict, config: dict) -> dict:
                 f"{city} #{pos} is a {p['page_type']} — content optimization alone will not outrank it"
             )
 
-    # Content coverage matrix (qualifying pages only)
-    for key in CONTENT_ELEMENT_KEYS:
-        present_count = 0
-        pos1_has = 0
-        pos1_total = 0
-        pos2_3_not = 0
-        pos2_3_total = 0
-        for p in qualifying:
-            ce = p.get("content_elements", {})
+    # Content coverage matrix (qualifying pages only) - one pass over pages
+    present_counts = Counter()
+    pos1_has_counts = Counter()
+    pos2_3_not_counts = Counter()
+    pos1_total = 0
+    for p in qualifying:
+        ce = p.get("content_elements", {})
+        is_pos1 = p.get("is_position_1")
+        if is_pos1:
+            pos1_total += 1
+        for key in CONTENT_ELEMENT_KEYS:
             el = ce.get(key, {})
             present = el.get("present", False) if isinstance(el, dict) else bool(el)
             if present:
-                present_count += 1
-            if p.get("is_position_1"):
-                pos1_total += 1
-                if present:
-                    pos1_has += 1
-            else:
-                pos2_3_total += 1
-                if not present:
-                    pos2_3_not += 1
+                present_counts[key] += 1
+                if is_pos1:
+                    pos1_has_counts[key] += 1
+            elif not is_pos1:
+                pos2_3_not_counts[key] += 1
+    pos2_3_total = len(qualifying) - pos1_total
 
+    for key in CONTENT_ELEMENT_KEYS:
+        present_count = present_counts[key]
+        pos1_has = pos1_has_counts[key]
+        pos2_3_not = pos2_3_not_counts[key]
         pct = round(100 * present_count / len(qualifying), 1) if qualifying else 0
         is_diff = (
             pos1_total > 0 and pos1_has == pos1_total and pos2_3_total > 0 and pos2_3_not > 0
@@ -466,12 +548,17 @@ def run_analysis(merged_data: dict, config: dict) -> dict:
     analysis["consensus_order"] = consensus
     analysis["section_groups"] = grouped
 
-    # Section intelligence
+    # Section intelligence - one lowercased H2 blob per position 1 page, built once
+    pos1_h2_blobs = [
+        "\n".join(h.get("text", "") for h in p.get("structure", {}).get("h2s", [])).lower()
+        for p in qualifying if p.get("is_position_1")
+    ]
     for group_name, members in grouped.items():
         count = len(members)
+        members_lower = [m.lower() for m in members]
         pos1_incl = sum(
-            1 for p in qualifying
-            if p.get("is_position_1") and any(m in str(p.get("structure", {}).get("h2s", [])) for m in members)
+            1 for blob in pos1_h2_blobs
+            if any(m in blob for m in members_lower)
         )
         rec = "Include" if count >= len(qualifying) // 2 else "Consider"
         analysis["section_intelligence"].append({
@@ -489,16 +576,22 @@ def run_analysis(merged_data: dict, config: dict) -> dict:
 def _fuzzy_group_sections(titles: list[str], threshold: int = 80) -> dict[str, list[str]]:
     """Group similar section titles using fuzzy matching."""
     groups = {}
+    group_keys = []  # group names in creation order
+    group_lower = []  # lowercased once, scored in C by rapidfuzz
     for t in titles:
-        matched = False
-        for group_name, members in groups.items():
-            if fuzz.ratio(t.lower(), group_name.lower()) >= threshold or \
-               fuzz.partial_ratio(t.lower(), group_name.lower()) >= 90:
-                members.append(t)
-                matched = True
-                break
-        if not matched:
+        t_lower = t.lower()
+        # First group (in creation order) matching on ratio or partial_ratio
+        hit = next(process.extract_iter(t_lower, group_lower, scorer=fuzz.ratio, score_cutoff=threshold), None)
+        first = hit[2] if hit else len(group_lower)
+        hit = next(process.extract_iter(t_lower, group_lower[:first], scorer=fuzz.partial_ratio, score_cutoff=90), None)
+        if hit:
+            first = hit[2]
+        if first < len(group_keys):
+            groups[group_keys[first]].append(t)
+        else:
             groups[t] = [t]
+            group_keys.append(t)
+            group_lower.append(t_lower)
     return groups
 
 
@@ -506,10 +599,11 @@ def _most_common_fuzzy(values: list[str]) -> str:
     """Find the most common value using fuzzy matching."""
     if not values:
         return ""
+    lowered = [v.lower() for v in values]
     best = values[0]
     best_count = 0
-    for v in values:
-        count = sum(1 for x in values if fuzz.ratio(v.lower(), x.lower()) >= 80)
+    for v, v_lower in zip(values, lowered):
+        count = sum(1 for _ in process.extract_iter(v_lower, lowered, scorer=fuzz.ratio, score_cutoff=80))
         if count > best_count:
             best_count = count
             best = v
@@ -4,15 +4,26 @@ Simple Flask app for running the competitive analysis pipeline.
 Uses background jobs to avoid request timeouts for long-running analysis.
 """
 
-import json
+import gzip
+import multiprocessing
 import os
+import shutil
+import tempfile
 import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 
+import ijson
+import orjson
 from dotenv import load_dotenv
-from flask import Flask, redirect, render_template, request, Response, send_file, url_for
+from flask import Flask, g, redirect, render_template, request, Response, send_from_directory, url_for
+from flask import Request as FlaskRequest
 
-from main import load_config, run_pipeline_with_config
+# main (and the pipeline modules it pulls in) is imported inside the views and job functions
+# that use it, so web workers don't load it at startup.
 
 load_dotenv()
 
@@ -22,28 +33,159 @@ AUTH_PASSWORD = os.environ.get("AUTH_PASSWORD")
 OUTPUTS_DIR = PROJECT_ROOT / "outputs"
 DATA_DIR = PROJECT_ROOT / "data"
 JOB_STATUS_PATH = DATA_DIR / "job_status.json"
+REDIS_URL = os.environ.get("REDIS_URL")
+JOB_TIMEOUT = "2h"
+AHREFS_SNIFF_BYTES = 4096
+
+# Pipeline runs execute in a worker process so they never hold a web thread or the GIL.
+# One worker: every run reads and writes the same data/*.json files.
+# "spawn" starts the worker from a clean interpreter instead of forking a threaded web server.
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def _new_executor() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=1, mp_context=_MP_CONTEXT)
+
+
+_EXECUTOR = _new_executor()
+
+# With REDIS_URL set, jobs go to an RQ queue instead (run `rq worker pipeline` next to the
+# web process; it must share data/ and outputs/ with it).
+_QUEUE = None
+if REDIS_URL:
+    from redis import Redis
+    from rq import Queue
+
+    _QUEUE = Queue("pipeline", connection=Redis.from_url(REDIS_URL))
+
+
+# In-memory copy of job_status.json. The file is written by whichever process runs the job,
+# so the cache is keyed by its (mtime_ns, size) and re-read only when that changes.
+_job_status_lock = threading.Lock()
+_job_status_cache = {"key": None, "value": None}
+# Wakes /job-stream clients when this process sees the job change
+_job_changed = threading.Condition()
+JOB_STREAM_CHECK_SECONDS = 1.0  # re-check the file for writes from worker processes
+JOB_STREAM_KEEPALIVE_SECONDS = 15.0
+# Each open stream holds a gthread thread; end it after this long and the page falls back to polling
+JOB_STREAM_MAX_SECONDS = 120.0
+
+
+def _job_status_key():
+    try:
+        st = JOB_STATUS_PATH.stat()
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _read_job_status_file():
+    """Parse job_status.json, retrying once on a bad read. Returns None if unreadable."""
+    for attempt in range(2):
+        try:
+            return orjson.loads(JOB_STATUS_PATH.read_bytes())
+        except orjson.JSONDecodeError:
+            if attempt == 0:
+                time.sleep(0.01)
+        except OSError:
+            return None
+    return None
 
 
 def _get_job_status() -> dict:
-    """Read current job status from file."""
-    if not JOB_STATUS_PATH.exists():
-        return {"status": "idle", "filename": None, "error": None}
+    """Read current job status (from memory unless the file changed)."""
+    with _job_status_lock:
+        key = _job_status_key()
+        if key is None:
+            return {"status": "idle", "filename": None, "error": None}
+        if _job_status_cache["key"] != key:
+            job = _read_job_status_file()
+            if job is None:
+                return {"status": "idle", "filename": None, "error": None}
+            _job_status_cache["value"] = job
+            _job_status_cache["key"] = key
+        job = dict(_job_status_cache["value"])
+    if job.get("status") == "running" and job.get("job_id") and _QUEUE is not None:
+        job = _check_queued_job(job)
+    return job
+
+
+def _set_job_status(status: str, filename: str = None, error: str = None, job_id: str = None) -> None:
+    """Write job status to file (and the in-memory copy)."""
+    job = {"status": status, "filename": filename, "error": error, "job_id": job_id}
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with _job_status_lock:
+        # Write a temp file and rename over the old one so readers never see a partial file
+        tmp_path = JOB_STATUS_PATH.with_name(f"{JOB_STATUS_PATH.name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(orjson.dumps(job))
+        os.replace(tmp_path, JOB_STATUS_PATH)
+        _job_status_cache["key"] = _job_status_key()
+        _job_status_cache["value"] = job
+    _notify_job_changed()
+
+
+def _notify_job_changed() -> None:
+    with _job_changed:
+        _job_changed.notify_all()
+
+
+def _check_queued_job(job: dict) -> dict:
+    """Catch RQ jobs that died without writing their own status (worker crash, timeout, expiry)."""
+    from rq.exceptions import NoSuchJobError
+    from rq.job import Job
+
     try:
-        with open(JOB_STATUS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+        rq_job = Job.fetch(job["job_id"], connection=_QUEUE.connection)
+    except NoSuchJobError:
+        error = "Job was lost by the queue."
     except Exception:
-        return {"status": "idle", "filename": None, "error": None}
+        # Redis unreachable: report what the file says
+        return job
+    else:
+        if rq_job.get_status() not in ("failed", "stopped", "canceled"):
+            return job
+        exc_info = rq_job.exc_info or ""
+        error = exc_info.strip().splitlines()[-1] if exc_info.strip() else f"Job {rq_job.get_status()}"
+    _set_job_status("failed", error=error)
+    return _get_job_status()
 
 
-def _set_job_status(status: str, filename: str = None, error: str = None) -> None:
-    """Write job status to file."""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    with open(JOB_STATUS_PATH, "w", encoding="utf-8") as f:
-        json.dump({"status": status, "filename": filename, "error": error}, f)
+def _on_job_done(future) -> None:
+    """Mark the job failed if the worker process itself died (the job functions catch normal errors)."""
+    exc = future.exception()
+    if exc is not None:
+        _set_job_status("failed", error=str(exc) or type(exc).__name__)
+    else:
+        # The worker wrote the final status itself; wake stream clients now
+        _notify_job_changed()
+
+
+def _submit_job(fn, config: dict) -> None:
+    """Mark the job running and hand it to the RQ queue or the local worker process."""
+    global _EXECUTOR
+    if _QUEUE is not None:
+        job_id = uuid.uuid4().hex
+        # Status is written before enqueueing so a fast worker can't be overwritten by it
+        _set_job_status("running", job_id=job_id)
+        try:
+            _QUEUE.enqueue(fn, config, job_id=job_id, job_timeout=JOB_TIMEOUT)
+        except Exception as e:
+            _set_job_status("failed", error=f"Could not queue job: {e}")
+        return
+    _set_job_status("running")
+    try:
+        future = _EXECUTOR.submit(fn, config)
+    except BrokenProcessPool:
+        # A previous worker crashed; start a fresh pool
+        _EXECUTOR = _new_executor()
+        future = _EXECUTOR.submit(fn, config)
+    future.add_done_callback(_on_job_done)
 
 
 def _run_analysis_background(config: dict) -> None:
-    """Run pipeline in background thread."""
+    """Run pipeline in the background worker process."""
+    from main import run_pipeline_with_config
+
     try:
         result = run_pipeline_with_config(config)
         if result["success"]:
@@ -55,7 +197,9 @@ def _run_analysis_background(config: dict) -> None:
 
 
 def _run_merge_background(config: dict) -> None:
-    """Run Ahrefs merge in background thread."""
+    """Run Ahrefs merge in the background worker process."""
+    from main import run_pipeline_with_config
+
     try:
         result = run_pipeline_with_config(config, skip_scrape=True, run_id="ahrefs")
         if result["success"]:
@@ -66,7 +210,29 @@ def _run_merge_background(config: dict) -> None:
         _set_job_status("failed", error=str(e))
 
 
+class UploadRequest(FlaskRequest):
+    """Spool file uploads straight into DATA_DIR, so the Ahrefs CSV can be renamed into place."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        f = tempfile.NamedTemporaryFile("wb+", dir=DATA_DIR, prefix="upload-", suffix=".part", delete=False)
+        g.setdefault("upload_paths", []).append(f.name)
+        return f
+
+
 app = Flask(__name__, static_folder="static", template_folder="templates")
+app.request_class = UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = 200 * 1024 * 1024  # large Ahrefs exports
+
+
+@app.teardown_request
+def _remove_upload_temps(exc=None):
+    """Delete spooled uploads that were not moved into place."""
+    for path in g.pop("upload_paths", []):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
 
 
 @app.before_request
@@ -91,19 +257,20 @@ def parse_cities_text(text: str) -> list[dict]:
         line = line.strip()
         if not line:
             continue
-        parts = [p.strip() for p in line.split(",")]
-        if len(parts) >= 2:
-            cities.append({"city": parts[0], "state": parts[1], "country": "United States"})
-        else:
-            cities.append({"city": parts[0], "state": "", "country": "United States"})
+        # Anything after a second comma (e.g. a country) is ignored
+        city, _, rest = line.partition(",")
+        state = rest.partition(",")[0]
+        cities.append({"city": city.strip(), "state": state.strip(), "country": "United States"})
     return cities
 
 
 @app.route("/")
 def index():
     """Show form with config defaults."""
+    from main import get_config
+
     try:
-        config = load_config()
+        config = get_config()
     except Exception:
         config = {
             "procedure": "LASIK",
@@ -148,31 +315,55 @@ def run():
             error="A job is already running. Please wait for it to finish.",
         ), 400
 
+    from main import get_config
+
     cities = parse_cities_text(cities_text)
-    config = load_config()
+    # Shallow copy is enough: only top-level keys are replaced
+    config = dict(get_config())
     config["procedure"] = procedure
     config["cities"] = cities
     config["num_results"] = num_results
 
-    _set_job_status("running")
-    thread = threading.Thread(target=_run_analysis_background, args=(config,))
-    thread.daemon = True
-    thread.start()
+    _submit_job(_run_analysis_background, config)
 
     return redirect(url_for("processing"))
 
 
+# URL list of the last run, kept in memory and keyed by last_urls.json's (mtime_ns, size).
+# Jobs run in another process, so the file is what tells us a newer run finished.
+_LAST_RESULTS = {"key": None, "urls": []}
+_last_results_lock = threading.Lock()
+
+
 def _get_urls_from_last_run():
     """Get URLs from the most recent run for Ahrefs Step 2."""
-    merged_path = DATA_DIR / "merged_data.json"
-    if not merged_path.exists():
-        return []
+    urls_path = DATA_DIR / "last_urls.json"
     try:
-        with open(merged_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return [p.get("url", "") for p in data.get("pages", []) if p.get("url")]
-    except Exception:
-        return []
+        st = urls_path.stat()
+    except OSError:
+        st = None
+    if st is not None:
+        key = (st.st_mtime_ns, st.st_size)
+        with _last_results_lock:
+            if _LAST_RESULTS["key"] == key:
+                return list(_LAST_RESULTS["urls"])
+            try:
+                urls = orjson.loads(urls_path.read_bytes())
+            except Exception:
+                urls = None
+            if urls is not None:
+                _LAST_RESULTS["key"] = key
+                _LAST_RESULTS["urls"] = urls
+                return list(urls)
+    # Runs from before last_urls.json existed: stream the URLs out of the merged file
+    for merged_path, opener in ((DATA_DIR / "merged_data.json.gz", gzip.open), (DATA_DIR / "merged_data.json", open)):
+        if merged_path.exists():
+            try:
+                with opener(merged_path, "rb") as f:
+                    return [u for u in ijson.items(f, "pages.item.url") if u]
+            except Exception:
+                return []
+    return []
 
 
 @app.route("/processing")
@@ -187,6 +378,36 @@ def job_status():
     return _get_job_status()
 
 
+@app.route("/job-stream")
+def job_stream():
+    """Push job status as Server-Sent Events until the job finishes (or JOB_STREAM_MAX_SECONDS pass)."""
+    def stream():
+        last = None
+        idle = 0.0
+        deadline = time.monotonic() + JOB_STREAM_MAX_SECONDS
+        while True:
+            job = _get_job_status()
+            payload = orjson.dumps(job)
+            if payload != last:
+                yield b"data: " + payload + b"\n\n"
+                last = payload
+                idle = 0.0
+            elif idle >= JOB_STREAM_KEEPALIVE_SECONDS:
+                yield b": keepalive\n\n"
+                idle = 0.0
+            if job.get("status") != "running" or time.monotonic() >= deadline:
+                return
+            with _job_changed:
+                _job_changed.wait(timeout=JOB_STREAM_CHECK_SECONDS)
+            idle += JOB_STREAM_CHECK_SECONDS
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/results/<filename>")
 def results(filename):
     """Show results summary, download link, and Step 2 Ahrefs upload."""
@@ -197,6 +418,23 @@ def results(filename):
     return render_template("results.html", filename=filename, urls=urls)
 
 
+def _save_upload(upload, dest: Path) -> None:
+    """Move a spooled upload into place with a rename; copy in 1 MB chunks if that isn't possible."""
+    stream = upload.stream
+    spooled = getattr(stream, "name", None)
+    if isinstance(spooled, str) and spooled in g.get("upload_paths", []):
+        stream.flush()
+        try:
+            os.replace(spooled, dest)
+            g.upload_paths.remove(spooled)
+            return
+        except OSError:
+            pass  # e.g. Windows won't rename an open file
+    stream.seek(0)
+    with open(dest, "wb") as dst:
+        shutil.copyfileobj(stream, dst, length=1 << 20)
+
+
 @app.route("/merge-ahrefs", methods=["POST"])
 def merge_ahrefs():
     """Step 2: Merge uploaded Ahrefs CSV and rebuild report (background)."""
@@ -209,6 +447,19 @@ def merge_ahrefs():
             error="Please upload an Ahrefs Batch Analysis CSV file.",
         ), 400
 
+    from ahrefs_parser import looks_like_ahrefs_header
+
+    # Sniff the header before saving anything or starting a job
+    sample = ahrefs_file.stream.read(AHREFS_SNIFF_BYTES)
+    ahrefs_file.stream.seek(0)
+    if not looks_like_ahrefs_header(sample):
+        return render_template(
+            "results.html",
+            filename=request.form.get("filename", ""),
+            urls=_get_urls_from_last_run(),
+            error="That file doesn't look like an Ahrefs Batch Analysis export (expected URL and Domain Rating / traffic columns).",
+        ), 400
+
     job = _get_job_status()
     if job["status"] == "running":
         return render_template(
@@ -220,31 +471,36 @@ def merge_ahrefs():
 
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     ahrefs_path = DATA_DIR / "ahrefs_batch.csv"
-    ahrefs_file.save(str(ahrefs_path))
+    _save_upload(ahrefs_file, ahrefs_path)
 
-    config = load_config()
-    _set_job_status("running")
-    thread = threading.Thread(target=_run_merge_background, args=(config,))
-    thread.daemon = True
-    thread.start()
+    from main import get_config
+
+    # The job gets a pickled copy, so the cached dict itself can be passed
+    config = get_config()
+    _submit_job(_run_merge_background, config)
 
     return redirect(url_for("processing"))
 
 
 @app.route("/download/<filename>")
 def download(filename):
-    """Serve the Excel file for download."""
-    output_path = OUTPUTS_DIR / filename
-    if not output_path.exists():
+    """Serve the Excel file for download (ETag / If-Modified-Since aware)."""
+    if not (OUTPUTS_DIR / filename).is_file():
         return "File not found.", 404
-    return send_file(
-        output_path,
+    # send_from_directory rejects paths outside OUTPUTS_DIR and streams the file
+    return send_from_directory(
+        OUTPUTS_DIR,
+        filename,
         as_attachment=True,
         download_name=filename,
         mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        conditional=True,
+        # Re-merges overwrite the same filename, so always revalidate (304 if unchanged)
+        max_age=0,
     )
 
 
 if __name__ == "__main__":
+    # Local development only; deployments run gunicorn (see gunicorn_conf.py)
     port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=False)
+    app.run(host="0.0.0.0", port=port, debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)
@@ -0,0 +1,21 @@
+"""
+Gunicorn settings for the web interface.
+Start with: gunicorn -c gunicorn_conf.py app:app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Threaded workers: downloads, uploads, /job-stream and status polls don't block each other.
+# An open /job-stream holds a thread for up to JOB_STREAM_MAX_SECONDS (app.py), so
+# keep GUNICORN_THREADS above the number of browser tabs expected to watch a run at once.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+
+# One worker by default: each worker owns its own job executor, and every run shares data/*.json.
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+# Large Ahrefs uploads and report downloads can take a while on slow connections.
+timeout = 300
+graceful_timeout = 30
@@ -5,17 +5,24 @@ Competitive page analysis pipeline for medical procedure SEO.
 """
 
 import argparse
+import copy
+import gzip
 import json
 import logging
 import os
 import sys
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain
 from pathlib import Path
 from typing import Optional
 
+import orjson
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Load environment variables
 load_dotenv()
@@ -34,21 +41,81 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def load_config() -> dict:
-    """Load configuration from config.json."""
+GZIP_LEVEL = 3  # JSON still compresses ~8:1 at this level, at about twice the speed of the default
+
+
+def _write_json(path: Path, data, indent: bool = False) -> None:
+    """Write JSON with orjson (gzipped if path ends in .gz). Int keys (section_order) are allowed."""
+    option = orjson.OPT_NON_STR_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    payload = orjson.dumps(data, option=option)
+    path = Path(path)
+    if path.suffix == ".gz":
+        with gzip.open(path, "wb", compresslevel=GZIP_LEVEL) as f:
+            f.write(payload)
+    else:
+        path.write_bytes(payload)
+
+
+def _read_json(path: Path):
+    """Read a JSON file with orjson (gunzipped if path ends in .gz)."""
+    path = Path(path)
+    if path.suffix == ".gz":
+        with gzip.open(path, "rb") as f:
+            return orjson.loads(f.read())
+    return orjson.loads(path.read_bytes())
+
+
+def _data_file(name: str) -> Optional[Path]:
+    """Existing intermediate file in DATA_DIR: name.gz, else plain name (older runs), else None."""
+    for path in (DATA_DIR / f"{name}.gz", DATA_DIR / name):
+        if path.exists():
+            return path
+    return None
+
+
+def _save_data(name: str, data) -> None:
+    """Write an intermediate file to DATA_DIR as name.gz, removing any older uncompressed copy."""
+    _write_json(DATA_DIR / f"{name}.gz", data)
+    (DATA_DIR / name).unlink(missing_ok=True)
+
+
+def _save_merged_data(merged_data: dict) -> None:
+    """Write merged_data.json.gz plus last_urls.json (just the page URLs, for the web results page)."""
+    _save_data("merged_data.json", merged_data)
+    urls = [p["url"] for p in merged_data.get("pages", []) if p.get("url")]
+    _write_json(DATA_DIR / "last_urls.json", urls)
+
+
+# Parsed config.json, keyed by (mtime_ns, size) so edits on disk are picked up
+_config_cache = {}
+
+
+def get_config() -> dict:
+    """Return the cached config.json dict (re-parsed only when the file changes). Do not mutate it."""
     config_path = PROJECT_ROOT / "config.json"
-    if not config_path.exists():
+    try:
+        st = config_path.stat()
+    except FileNotFoundError:
         logger.error("config.json not found. Please create it from the example.")
         sys.exit(1)
-    with open(config_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    key = (st.st_mtime_ns, st.st_size)
+    if _config_cache.get("key") != key:
+        _config_cache["value"] = _read_json(config_path)
+        _config_cache["key"] = key
+    return _config_cache["value"]
+
+
+def load_config() -> dict:
+    """Load configuration from config.json as a private copy the caller may modify."""
+    return copy.deepcopy(get_config())
 
 
 def save_config(config: dict) -> None:
     """Save configuration back to config.json."""
     config_path = PROJECT_ROOT / "config.json"
-    with open(config_path, "w", encoding="utf-8") as f:
-        json.dump(config, f, indent=2)
+    _write_json(config_path, config, indent=True)
 
 
 def cli_prompt(config: dict) -> dict:
@@ -76,12 +143,10 @@ def cli_prompt(config: dict) -> dict:
         line = input().strip()
         if not line:
             break
-        # Support "City, State" or "City" format
-        parts = [p.strip() for p in line.split(",")]
-        if len(parts) >= 2:
-            cities.append({"city": parts[0], "state": parts[1], "country": "United States"})
-        else:
-            cities.append({"city": parts[0], "state": "", "country": "United States"})
+        # Support "City, State" or "City" format (anything after a second comma is ignored)
+        city, _, rest = line.partition(",")
+        state = rest.partition(",")[0]
+        cities.append({"city": city.strip(), "state": state.strip(), "country": "United States"})
 
     if cities:
         config["cities"] = cities
@@ -89,10 +154,76 @@ def cli_prompt(config: dict) -> dict:
     return config
 
 
+SERP_MAX_WORKERS = 16
+
+# One pooled session for all SerpAPI calls, so concurrent and repeat runs reuse TLS connections.
+# Transient errors and rate limiting are retried with backoff.
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=SERP_MAX_WORKERS,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+    ),
+)
+
+
+def _fetch_serp_for_city(
+    session: requests.Session,
+    api_key: str,
+    procedure: str,
+    num_results: int,
+    city_data: dict,
+) -> list[dict]:
+    """Query SerpAPI for one city. Returns that city's SERP result dicts (empty on error)."""
+    city = city_data["city"]
+    state = city_data.get("state", "")
+    country = city_data.get("country", "United States")
+    keyword = f"{procedure} {city}"
+    location = f"{city}, {state}, {country}".strip(", ")
+
+    params = {
+        "q": keyword,
+        "location": location,
+        "api_key": api_key,
+        "num": min(num_results + 5, 100),  # Request extra in case some are filtered
+        "engine": "google",
+    }
+
+    try:
+        resp = session.get("https://serpapi.com/search", params=params, timeout=30)
+        resp.raise_for_status()
+        data = resp.json()
+    except requests.RequestException as e:
+        logger.error(f"SerpAPI request failed for {keyword}: {e}")
+        return []
+    except json.JSONDecodeError as e:
+        logger.error(f"SerpAPI response parse error for {keyword}: {e}")
+        return []
+
+    results = []
+    organic = data.get("organic_results", [])
+    for i, item in enumerate(organic[:num_results]):
+        pos = i + 1
+        results.append({
+            "position": pos,
+            "url": item.get("link", ""),
+            "page_title": item.get("title", ""),
+            "meta_description": item.get("snippet", ""),
+            "city": city,
+            "state": state,
+            "country": country,
+            "keyword": keyword,
+            "is_position_1": pos == 1,
+        })
+    return results
+
+
 def fetch_serp_results(config: dict) -> list[dict]:
     """
-    Query SerpAPI for organic results per city.
-    Returns list of SERP result dicts.
+    Query SerpAPI for organic results per city (cities fetched concurrently).
+    Returns list of SERP result dicts, in city order.
     """
     api_key = os.getenv("SERPAPI_KEY")
     if not api_key or api_key == "paste_your_key_here":
@@ -101,50 +232,15 @@ def fetch_serp_results(config: dict) -> list[dict]:
     procedure = config["procedure"]
     cities = config["cities"]
     num_results = config.get("num_results", 3)
+    if not cities:
+        return []
 
-    results = []
-    for city_data in cities:
-        city = city_data["city"]
-        state = city_data.get("state", "")
-        country = city_data.get("country", "United States")
-        keyword = f"{procedure} {city}"
-        location = f"{city}, {state}, {country}".strip(", ")
-
-        params = {
-            "q": keyword,
-            "location": location,
-            "api_key": api_key,
-            "num": min(num_results + 5, 100),  # Request extra in case some are filtered
-            "engine": "google",
-        }
-
-        try:
-            resp = requests.get("https://serpapi.com/search", params=params, timeout=30)
-            resp.raise_for_status()
-            data = resp.json()
-        except requests.RequestException as e:
-            logger.error(f"SerpAPI request failed for {keyword}: {e}")
-            continue
-        except json.JSONDecodeError as e:
-            logger.error(f"SerpAPI response parse error for {keyword}: {e}")
-            continue
-
-        organic = data.get("organic_results", [])
-        for i, item in enumerate(organic[:num_results]):
-            pos = i + 1
-            results.append({
-                "position": pos,
-                "url": item.get("link", ""),
-                "page_title": item.get("title", ""),
-                "meta_description": item.get("snippet", ""),
-                "city": city,
-                "state": state,
-                "country": country,
-                "keyword": keyword,
-                "is_position_1": pos == 1,
-            })
-
-    return results
+    with ThreadPoolExecutor(max_workers=min(SERP_MAX_WORKERS, len(cities))) as executor:
+        per_city = executor.map(
+            lambda c: _fetch_serp_for_city(_SESSION, api_key, procedure, num_results, c),
+            cities,
+        )
+        return list(chain.from_iterable(per_city))
 
 
 def run_pipeline(skip_scrape: bool = False, ahrefs_only: bool = False, no_prompt: bool = False) -> None:
@@ -170,72 +266,59 @@ def run_pipeline(skip_scrape: bool = False, ahrefs_only: bool = False, no_prompt
 
     # --- STEP 1: SERP Data (unless skip-scrape or ahrefs-only) ---
     if ahrefs_only:
-        serp_path = DATA_DIR / "serp_results.json"
-        scraped_path = DATA_DIR / "scraped_pages.json"
-        merged_path = DATA_DIR / "merged_data.json"
-        if not merged_path.exists() and not scraped_path.exists():
-            logger.error("No existing data. Run full pipeline first or provide scraped_pages.json.")
+        serp_path = _data_file("serp_results.json")
+        scraped_path = _data_file("scraped_pages.json")
+        merged_path = _data_file("merged_data.json")
+        if merged_path is None and scraped_path is None:
+            logger.error("No existing data. Run full pipeline first or provide scraped_pages.json(.gz).")
             sys.exit(1)
         # Load pages from merged or serp+scraped, then re-merge Ahrefs (picks up new CSV)
-        if merged_path.exists():
-            with open(merged_path, "r", encoding="utf-8") as f:
-                prev = json.load(f)
+        if merged_path is not None:
+            prev = _read_json(merged_path)
             scraped_pages = prev.get("pages", [])
         else:
-            with open(serp_path, "r", encoding="utf-8") as f:
-                serp_results = json.load(f)
-            with open(scraped_path, "r", encoding="utf-8") as f:
-                scraped_pages = json.load(f)
+            serp_results = _read_json(serp_path)
+            scraped_pages = _read_json(scraped_path)
         merged_data = merge_ahrefs_data([], scraped_pages, config)
-        with open(merged_path, "w", encoding="utf-8") as f:
-            json.dump(merged_data, f, indent=2)
+        _save_merged_data(merged_data)
         analysis = run_analysis(merged_data, config)
-        with open(DATA_DIR / "analysis.json", "w", encoding="utf-8") as f:
-            json.dump(analysis, f, indent=2)
+        _save_data("analysis.json", analysis)
         output_path = build_excel(procedure, merged_data, analysis, config)
         _print_summary(procedure, cities, merged_data, analysis, output_path)
         return
 
     if not skip_scrape:
         serp_results = fetch_serp_results(config)
-        with open(DATA_DIR / "serp_results.json", "w", encoding="utf-8") as f:
-            json.dump(serp_results, f, indent=2)
-        logger.info(f"Saved {len(serp_results)} SERP results to data/serp_results.json")
+        _save_data("serp_results.json", serp_results)
+        logger.info(f"Saved {len(serp_results)} SERP results to data/serp_results.json.gz")
 
         # Preliminary URL-based classification
         serp_results = classify_url_pre_scrape(serp_results, config)
 
         # --- STEP 2: Scraping ---
         scraped_pages = scrape_urls(serp_results, config)
-        with open(DATA_DIR / "scraped_pages.json", "w", encoding="utf-8") as f:
-            json.dump(scraped_pages, f, indent=2)
-        logger.info(f"Saved scraped data to data/scraped_pages.json")
 
-        # Re-classify with content signals
+        # Re-classify with content signals, then save once
         scraped_pages = classify_pages_post_scrape(scraped_pages, config)
-        with open(DATA_DIR / "scraped_pages.json", "w", encoding="utf-8") as f:
-            json.dump(scraped_pages, f, indent=2)
+        _save_data("scraped_pages.json", scraped_pages)
+        logger.info(f"Saved scraped data to data/scraped_pages.json.gz")
     else:
         # Load from saved files
-        serp_path = DATA_DIR / "serp_results.json"
-        scraped_path = DATA_DIR / "scraped_pages.json"
-        if not serp_path.exists() or not scraped_path.exists():
-            logger.error("--skip-scrape requires existing serp_results.json and scraped_pages.json")
+        serp_path = _data_file("serp_results.json")
+        scraped_path = _data_file("scraped_pages.json")
+        if serp_path is None or scraped_path is None:
+            logger.error("--skip-scrape requires existing serp_results.json(.gz) and scraped_pages.json(.gz)")
             sys.exit(1)
-        with open(serp_path, "r", encoding="utf-8") as f:
-            serp_results = json.load(f)
-        with open(scraped_path, "r", encoding="utf-8") as f:
-            scraped_pages = json.load(f)
+        serp_results = _read_json(serp_path)
+        scraped_pages = _read_json(scraped_path)
 
     # --- STEP 3: Ahrefs ---
     merged_data = merge_ahrefs_data(serp_results, scraped_pages, config)
-    with open(DATA_DIR / "merged_data.json", "w", encoding="utf-8") as f:
-        json.dump(merged_data, f, indent=2)
+    _save_merged_data(merged_data)
 
     # --- STEP 4: Analysis ---
     analysis = run_analysis(merged_data, config)
-    with open(DATA_DIR / "analysis.json", "w", encoding="utf-8") as f:
-        json.dump(analysis, f, indent=2)
+    _save_data("analysis.json", analysis)
 
     # --- STEP 5: Excel ---
     output_path = build_excel(procedure, merged_data, analysis, config)
@@ -270,40 +353,28 @@ def run_pipeline_with_config(
 
     try:
         if skip_scrape:
-            serp_path = DATA_DIR / "serp_results.json"
-            scraped_path = DATA_DIR / "scraped_pages.json"
-            if not serp_path.exists() or not scraped_path.exists():
+            serp_path = _data_file("serp_results.json")
+            scraped_path = _data_file("scraped_pages.json")
+            if serp_path is None or scraped_path is None:
                 return {"success": False, "error": "No saved data. Run full scrape first."}
-            with open(serp_path, "r", encoding="utf-8") as f:
-                serp_results = json.load(f)
-            with open(scraped_path, "r", encoding="utf-8") as f:
-                scraped_pages = json.load(f)
+            serp_results = _read_json(serp_path)
+            scraped_pages = _read_json(scraped_path)
         else:
             serp_results = fetch_serp_results(config)
-            with open(DATA_DIR / "serp_results.json", "w", encoding="utf-8") as f:
-                json.dump(serp_results, f, indent=2)
+            _save_data("serp_results.json", serp_results)
             serp_results = classify_url_pre_scrape(serp_results, config)
             scraped_pages = scrape_urls(serp_results, config)
-            with open(DATA_DIR / "scraped_pages.json", "w", encoding="utf-8") as f:
-                json.dump(scraped_pages, f, indent=2)
             scraped_pages = classify_pages_post_scrape(scraped_pages, config)
-            with open(DATA_DIR / "scraped_pages.json", "w", encoding="utf-8") as f:
-                json.dump(scraped_pages, f, indent=2)
+            _save_data("scraped_pages.json", scraped_pages)
 
         merged_data = merge_ahrefs_data(serp_results, scraped_pages, config)
-        with open(DATA_DIR / "merged_data.json", "w", encoding="utf-8") as f:
-            json.dump(merged_data, f, indent=2)
+        _save_merged_data(merged_data)
 
         analysis = run_analysis(merged_data, config)
-        with open(DATA_DIR / "analysis.json", "w", encoding="utf-8") as f:
-            json.dump(analysis, f, indent=2)
+        _save_data("analysis.json", analysis)
 
         output_path = build_excel(procedure, merged_data, analysis, config, run_id=run_id)
-        pages = merged_data.get("pages", [])
-        type_counts = {}
-        for p in pages:
-            t = p.get("page_type", "Unknown")
-            type_counts[t] = type_counts.get(t, 0) + 1
+        stats = _summarize_pages(merged_data.get("pages", []))
 
         return {
             "success": True,
@@ -312,10 +383,10 @@ def run_pipeline_with_config(
             "summary": {
                 "procedure": procedure,
                 "cities": ", ".join(c.get("city", "") for c in cities),
-                "total_pages": len(pages),
-                "scraped_ok": sum(1 for p in pages if p.get("scraped") and not p.get("scrape_failed")),
-                "ahrefs_matched": sum(1 for p in pages if p.get("ahrefs_matched", False)),
-                "page_types": type_counts,
+                "total_pages": stats["total"],
+                "scraped_ok": stats["scraped_ok"],
+                "ahrefs_matched": stats["ahrefs_matched"],
+                "page_types": stats["type_counts"],
                 "differentiators": analysis.get("position_1_differentiators", [])[:5],
                 "auth_driven": analysis.get("authority_driven_rankings", []),
             },
@@ -327,6 +398,31 @@ def run_pipeline_with_config(
         return {"success": False, "error": str(e)}
 
 
+def _summarize_pages(pages: list[dict]) -> dict:
+    """Count scrape outcomes, Ahrefs matches and page types in one pass over the pages."""
+    scraped_ok = failed = js_flag = ahrefs_matched = 0
+    type_counts = {}
+    for p in pages:
+        if p.get("scrape_failed"):
+            failed += 1
+        elif p.get("scraped"):
+            scraped_ok += 1
+        if p.get("js_rendering_flagged"):
+            js_flag += 1
+        if p.get("ahrefs_matched"):
+            ahrefs_matched += 1
+        t = p.get("page_type", "Unknown")
+        type_counts[t] = type_counts.get(t, 0) + 1
+    return {
+        "total": len(pages),
+        "scraped_ok": scraped_ok,
+        "failed": failed,
+        "js_flagged": js_flag,
+        "ahrefs_matched": ahrefs_matched,
+        "type_counts": type_counts,
+    }
+
+
 def _print_summary(
     procedure: str,
     cities: list,
@@ -335,20 +431,15 @@ def _print_summary(
     output_path: Path,
 ) -> None:
     """Print terminal summary."""
-    pages = merged_data.get("pages", [])
-    total = len(pages)
-    scraped_ok = sum(1 for p in pages if p.get("scraped") and not p.get("scrape_failed"))
-    failed = sum(1 for p in pages if p.get("scrape_failed"))
-    js_flag = sum(1 for p in pages if p.get("js_rendering_flagged"))
-    ahrefs_matched = sum(1 for p in pages if p.get("ahrefs_matched"))
+    stats = _summarize_pages(merged_data.get("pages", []))
+    total = stats["total"]
+    scraped_ok = stats["scraped_ok"]
+    failed = stats["failed"]
+    js_flag = stats["js_flagged"]
+    ahrefs_matched = stats["ahrefs_matched"]
+    type_counts = stats["type_counts"]
     city_names = ", ".join(c.get("city", "") for c in cities)
 
-    # Page type counts
-    type_counts = {}
-    for p in pages:
-        t = p.get("page_type", "Unknown")
-        type_counts[t] = type_counts.get(t, 0) + 1
-
     print("\n========================================")
     print("=== PAGE STRUCTURE COMPARISON TOOL ===\n")
     print(f"Procedure: {procedure}")
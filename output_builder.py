@@ -3,18 +3,35 @@ Page Structure Comparison Tool - Excel Output Builder
 Generates multi-tab Excel workbook with analysis results.
 """
 
-from datetime import datetime
+import io
+from collections import Counter
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Optional
+from xml.sax.saxutils import escape
+from zipfile import ZIP_DEFLATED, ZipFile
 
 from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Fill, Font, PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ERROR_CODES, ILLEGAL_CHARACTERS_RE
+from openpyxl.compat import safe_string
+from openpyxl.styles import Font, NamedStyle, PatternFill
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
+from openpyxl.writer.excel import ExcelWriter
 
 PROJECT_ROOT = Path(__file__).parent.resolve()
 OUTPUTS_DIR = PROJECT_ROOT / "outputs"
 
+URL_COLUMN_WIDTH = 60
+# Deflate level for the saved .xlsx: level 1 is several times faster than
+# zlib's default and the reports only come out slightly larger.
+XLSX_COMPRESS_LEVEL = 1
+# lxml writes carriage returns in cell text as character references
+_XML_TEXT_ESCAPES = {"\r": "&#13;"}
+
 # Cell styling
+BOLD_FONT = Font(bold=True)
 GREEN_FILL = PatternFill(start_color="C6EFCE", end_color="C6EFCE", fill_type="solid")
 RED_FILL = PatternFill(start_color="FFC7CE", end_color="FFC7CE", fill_type="solid")
 YELLOW_FILL = PatternFill(start_color="FFEB9C", end_color="FFEB9C", fill_type="solid")
@@ -38,6 +55,21 @@ RANKING_DRIVER_FILLS = {
     "Authority + Content": PatternFill(start_color="E3F2FD", end_color="E3F2FD", fill_type="solid"),  # light blue
 }
 
+# Named styles, registered once per workbook. Styled cells pick them up by
+# name instead of re-hashing a Font/PatternFill for every cell.
+HEADER_STYLE = "Header"
+FILL_STYLES = {
+    "Present": GREEN_FILL,
+    "Absent": RED_FILL,
+    "Partial": YELLOW_FILL,
+    "Differentiator": GOLD_FILL,
+    "Consensus": LIGHT_BLUE_FILL,
+}
+DIAGNOSIS_STYLES = {diag: f"Diagnosis: {diag}" for diag in DIAGNOSIS_FILLS}
+RANKING_DRIVER_STYLES = {drv: f"Ranking Driver: {drv}" for drv in RANKING_DRIVER_FILLS}
+FILL_STYLES.update({DIAGNOSIS_STYLES[k]: f for k, f in DIAGNOSIS_FILLS.items()})
+FILL_STYLES.update({RANKING_DRIVER_STYLES[k]: f for k, f in RANKING_DRIVER_FILLS.items()})
+
 
 # Section type taxonomy for LLM classification (Category, Section Type, Example Headings)
 SECTION_TYPE_TAXONOMY = [
@@ -90,17 +122,119 @@ SECTION_TYPE_TAXONOMY = [
 ]
 
 
+def _add_named_styles(wb) -> None:
+    """Register the header and fill styles on a new workbook."""
+    wb.add_named_style(NamedStyle(name=HEADER_STYLE, font=BOLD_FONT))
+    for name, fill in FILL_STYLES.items():
+        wb.add_named_style(NamedStyle(name=name, font=DEFAULT_FONT, fill=fill))
+
+
+def _styled_cell(ws, value, style: Optional[str]):
+    """Write-only cell with a named style; plain value when there is no style."""
+    if style is None:
+        return value
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+def _styled_cells(ws, styles: dict) -> dict:
+    """Prebuilt styled cells for a sheet, keyed by value.
+
+    The write-only sheet serialises every appended row straight away, so one
+    styled cell can be appended in as many rows as its value appears in.
+    """
+    return {value: _styled_cell(ws, value, style) for value, style in styles.items()}
+
+
+def _set_url_column_width(ws, headers: list) -> None:
+    """Widen the URL column so full URLs stay readable without truncating them."""
+    ws.column_dimensions[get_column_letter(headers.index("URL") + 1)].width = URL_COLUMN_WIDTH
+
+
+def _rows_xml(rows: list[list], first_row: int) -> Optional[str]:
+    """Render plain-value rows as sheet <row> XML, encoding cells the way openpyxl does.
+
+    Returns None if any value needs openpyxl's own handling (formulas, error
+    codes, illegal characters, other types), so the caller can append instead.
+    """
+    letters = [get_column_letter(c) for c in range(1, max(map(len, rows), default=0) + 1)]
+    out = []
+    for r, row in enumerate(rows, first_row):
+        out.append(f'<row r="{r}">')
+        for letter, val in zip(letters, row):
+            if val is None:
+                continue
+            t = type(val)
+            if t is str:
+                if (len(val) > 1 and val.startswith("=")) or val in ERROR_CODES or ILLEGAL_CHARACTERS_RE.search(val):
+                    return None
+                if not val:
+                    out.append(f'<c r="{letter}{r}" t="inlineStr"></c>')
+                    continue
+                val = val[:32767]
+                space = ' xml:space="preserve"' if val != val.strip() else ""
+                out.append(f'<c r="{letter}{r}" t="inlineStr"><is><t{space}>{escape(val, _XML_TEXT_ESCAPES)}</t></is></c>')
+            elif t is int or t is float:
+                out.append(f'<c r="{letter}{r}" t="n"><v>{safe_string(val)}</v></c>')
+            elif t is bool:
+                out.append(f'<c r="{letter}{r}" t="b"><v>{safe_string(val)}</v></c>')
+            else:
+                return None
+        out.append("</row>")
+    return "".join(out)
+
+
+class _RowsXmlZipFile(ZipFile):
+    """ZipFile that splices prerendered <row> XML into write-only sheet parts as openpyxl adds them."""
+
+    def __init__(self, *args, sheet_rows: Optional[dict] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sheet_rows = dict(sheet_rows or {})  # sheets whose rows are still to be spliced
+
+    def write(self, filename, arcname=None, *args, **kwargs):
+        for ws, rows_xml in self.sheet_rows.items():
+            if arcname == ws.path[1:]:
+                xml = Path(filename).read_bytes()
+                self.writestr(arcname, xml.replace(b"</sheetData>", rows_xml.encode() + b"</sheetData>", 1))
+                del self.sheet_rows[ws]
+                return
+        super().write(filename, arcname, *args, **kwargs)
+
+
+def _save_workbook(wb, path: Path, sheet_rows: Optional[dict] = None) -> None:
+    """Same as wb.save(path), but with a faster zip compression level.
+
+    sheet_rows maps write-only sheets to <row> XML (see _rows_xml) that goes
+    after the rows appended to them. The zip is built in memory and written
+    in one go, so an error while building it leaves no partial .xlsx behind.
+    Raises RuntimeError if openpyxl never wrote one of those sheet parts
+    through ZipFile.write (so its rows could not be added).
+    """
+    wb.properties.modified = datetime.now(timezone.utc).replace(tzinfo=None)
+    buf = io.BytesIO()
+    archive = _RowsXmlZipFile(
+        buf, "w", ZIP_DEFLATED, allowZip64=True, compresslevel=XLSX_COMPRESS_LEVEL, sheet_rows=sheet_rows,
+    )
+    ExcelWriter(wb, archive).save()
+    if archive.sheet_rows:
+        titles = ", ".join(ws.title for ws in archive.sheet_rows)
+        raise RuntimeError(f"Could not add rows to sheet(s) {titles}: unexpected openpyxl writer behaviour")
+    path.write_bytes(buf.getbuffer())
+
+
+def _header_cells(ws, headers: list) -> list:
+    """Bold header cells for a write-only sheet."""
+    return [_styled_cell(ws, h, HEADER_STYLE) for h in headers]
+
+
 def _add_section_type_reference_sheet(wb) -> None:
     """Add Section Type Reference sheet for LLM classification."""
     ws = wb.create_sheet("Section Type Reference")
-    headers = ["Category", "Section Type", "Example Headings"]
-    for c, h in enumerate(headers, 1):
-        ws.cell(row=1, column=c, value=h).font = Font(bold=True)
-    for r, (cat, stype, examples) in enumerate(SECTION_TYPE_TAXONOMY, 2):
-        ws.cell(row=r, column=1, value=cat)
-        ws.cell(row=r, column=2, value=stype)
-        ws.cell(row=r, column=3, value=examples)
     ws.freeze_panes = "A2"
+    ws.append(_header_cells(ws, ["Category", "Section Type", "Example Headings"]))
+    for row in SECTION_TYPE_TAXONOMY:
+        ws.append(row)
 
 
 def _page_label(page: dict) -> str:
@@ -108,27 +242,22 @@ def _page_label(page: dict) -> str:
     return f"{page.get('city', '')} #{page.get('position', '')}"
 
 
-def _cell_value(ce: dict, key: str) -> str:
-    """Convert content element to display value: ✅ Present / ❌ Absent / ⚠️ Partial"""
-    el = ce.get(key, {}) if isinstance(ce, dict) else {}
-    if isinstance(el, dict):
-        present = el.get("present", False)
-        if present:
-            return "✅ Present"
-        # Check for partial
-        if el.get("exact_text") or el.get("found") or el.get("claims"):
-            return "⚠️ Partial"
-    return "❌ Absent"
+# Content matrix cell states: (display value, named style)
+PRESENT = ("✅ Present", "Present")
+PARTIAL = ("⚠️ Partial", "Partial")
+ABSENT = ("❌ Absent", "Absent")
 
 
-def _cell_fill(val: str) -> Optional[PatternFill]:
-    if "✅" in val:
-        return GREEN_FILL
-    if "❌" in val:
-        return RED_FILL
-    if "⚠️" in val:
-        return YELLOW_FILL
-    return None
+def _classify(el) -> tuple[str, str]:
+    """Content element -> ✅ Present / ❌ Absent / ⚠️ Partial cell state"""
+    if isinstance(el, dict):
+        get = el.get
+        if get("present"):
+            return PRESENT
+        # Check for partial
+        if get("exact_text") or get("found") or get("claims"):
+            return PARTIAL
+    return ABSENT
 
 
 # Content element keys in display order
@@ -161,9 +290,69 @@ ELEMENT_NAMES = {
 }
 
 
-def _qualifying_pages(pages: list[dict]) -> list[dict]:
+# Sheet header rows
+MATRIX_HEADERS = ["Content Element", "Count", "%", "Wireframe Priority"]
+SWC_HEADERS = ["Page", "Position", "H2 Text", "Word Count", "Context Snippet", "Page Type"]
+AUTH_HEADERS = [
+    "City", "Position", "URL", "Page Type", "Classification Confidence",
+    "Domain Rating", "URL Rating", "Referring Domains", "Backlinks",
+    "Organic Traffic", "Content Richness Score", "Diagnosis",
+    "Ranking Driver", "Ranking Driver Note", "Notes",
+]
+ATF_HEADERS = [
+    "City", "Position", "URL", "Page Type", "Hero Headline", "Hero Subheadline",
+    "Primary CTA Text", "CTA Location", "Has Trust Badge in Hero", "Has Video in Hero",
+    "Has Background Image", "First Impression Summary",
+]
+SI_HEADERS = [
+    "Section Topic", "Pages Containing It", "Position 1 Pages That Include It",
+    "Typical Position on Page", "Estimated Word Count Range", "Wireframe Recommendation",
+]
+# analysis["section_intelligence"] keys, in SI_HEADERS order
+SI_KEYS = [
+    "section_topic", "pages_containing", "position_1_include",
+    "typical_position", "word_count_range", "wireframe_recommendation",
+]
+TD_HEADERS = [
+    "City", "Position", "URL", "Page Type", "Technologies Mentioned",
+    "Credential Claims", "Statistical Claims", "Financing Mentioned", "Unique Differentiators",
+]
+PT_HEADERS = [
+    "City", "Position", "URL", "Detected Page Type", "Classification Confidence",
+    "URL Signal", "Content Signal", "Final Classification", "Wireframe Weight", "Notes",
+]
+RAW_HEADERS = [
+    "city", "position", "url", "page_type", "page_title", "meta_description",
+    "h1", "word_count", "domain_rating", "url_rating", "content_richness_score", "diagnosis",
+    "js_rendering_flagged", "scrape_failed", "faq", "testimonials", "surgeon_credentials",
+    "technology", "online_scheduling", "outcome_stats",
+]
+
+# Notes column text. Authority Profile notes are keyed by (page_type, js flagged)
+# for the page types that carry a note; Page Type Summary notes are keyed by
+# (js flagged, flagged homepage).
+JS_RENDERING_NOTE = "⚠️ May require JS rendering"
+_AUTHORITY_PAGE_TYPE_NOTES = {
+    "Homepage": "Homepage ranking — authority driven",
+    "Geo Page": "Geo page ranking — different intent",
+}
+AUTHORITY_NOTES = {
+    (page_type, js): f"{note} {JS_RENDERING_NOTE}" if js else note
+    for page_type, note in _AUTHORITY_PAGE_TYPE_NOTES.items()
+    for js in (False, True)
+}
+_HOMEPAGE_NOTE = "Homepage ranking — domain authority likely the primary ranking factor"
+PAGE_TYPE_NOTES = {
+    (False, False): "",
+    (True, False): JS_RENDERING_NOTE,
+    (False, True): _HOMEPAGE_NOTE,
+    (True, True): f"{JS_RENDERING_NOTE} {_HOMEPAGE_NOTE}",
+}
+
+
+def _qualifying_rows(page_rows: list[tuple]) -> list[tuple]:
     """Service Page and Procedure+Location only for content matrix."""
-    return [p for p in pages if p.get("page_type") in ("Service Page", "Procedure+Location")]
+    return [row for row in page_rows if row[1][3] in ("Service Page", "Procedure+Location")]
 
 
 def build_excel(
@@ -180,106 +369,99 @@ def build_excel(
     filename = f"{procedure}_competitive_analysis_{date_str}{suffix}.xlsx"
     output_path = OUTPUTS_DIR / filename
 
-    wb = Workbook()
+    # write_only streams each row to disk as it is appended, so every sheet is
+    # written top to bottom and freeze_panes is set before the first row.
+    wb = Workbook(write_only=True)
+    _add_named_styles(wb)
     pages = merged_data.get("pages", [])
-    qualifying = _qualifying_pages(pages) or pages  # fallback if no Service/Procedure+Location
     coverage = {c["key"]: c for c in analysis.get("content_coverage", [])}
 
+    # City / Position / URL / Page Type lead every per-page tab; read them and
+    # the page label once per page, and normalise content_elements to a dict so
+    # no tab re-checks it.
+    page_rows = []
+    for p in pages:
+        ce = p.get("content_elements")
+        base = (p.get("city", ""), p.get("position", ""), p.get("url", "") or "", p.get("page_type", ""))
+        page_rows.append((p, base, ce if isinstance(ce, dict) else {}, _page_label(p)))
+    q_rows = _qualifying_rows(page_rows) or page_rows  # fallback if no Service/Procedure+Location
+    q_labels = [label for _, _, _, label in q_rows]
+    q_ce = [ce for _, _, ce, _ in q_rows]
+
     # --- Tab 1: Master Content Matrix ---
-    ws1 = wb.active
-    ws1.title = "Master Content Matrix"
-    headers = ["Content Element", "Count", "%", "Wireframe Priority"]
-    q_labels = [f"{_page_label(p)} ({p.get('page_type', '')})" for p in qualifying]
-    headers.extend(q_labels)
-    for c, h in enumerate(headers, 1):
-        cell = ws1.cell(row=1, column=c, value=h)
-        cell.font = Font(bold=True)
+    ws1 = wb.create_sheet("Master Content Matrix")
     ws1.freeze_panes = "B2"
+    headers = MATRIX_HEADERS + [f"{label} ({base[3]})" for _, base, _, label in q_rows]
+    ws1.append(_header_cells(ws1, headers))
+    matrix_cells = {state: _styled_cell(ws1, *state) for state in (PRESENT, PARTIAL, ABSENT)}
+    # One column per page, classifying every key while that page's dict is at hand
+    matrix_cols = [[matrix_cells[_classify(ce.get(key))] for key in CONTENT_KEYS] for ce in q_ce]
 
-    for r, key in enumerate(CONTENT_KEYS, 2):
+    for i, key in enumerate(CONTENT_KEYS):
         cov = coverage.get(key, {})
-        ws1.cell(row=r, column=1, value=ELEMENT_NAMES.get(key, key))
-        ws1.cell(row=r, column=2, value=cov.get("count", ""))
-        ws1.cell(row=r, column=3, value=f"{cov.get('percentage', 0)}%")
-        ws1.cell(row=r, column=4, value=cov.get("wireframe_priority", ""))
-        if cov.get("position_1_differentiator"):
-            ws1.cell(row=r, column=1).fill = GOLD_FILL
-        for c, p in enumerate(qualifying, 5):
-            ce = p.get("content_elements", {})
-            val = _cell_value(ce, key)
-            cell = ws1.cell(row=r, column=c, value=val)
-            f = _cell_fill(val)
-            if f:
-                cell.fill = f
+        name = ELEMENT_NAMES.get(key, key)
+        row = [
+            _styled_cell(ws1, name, "Differentiator" if cov.get("position_1_differentiator") else None),
+            cov.get("count", ""),
+            f"{cov.get('percentage', 0)}%",
+            cov.get("wireframe_priority", ""),
+        ]
+        row.extend(col[i] for col in matrix_cols)
+        ws1.append(row)
 
     # --- Tab 2: Section Order Map ---
     ws2 = wb.create_sheet("Section Order Map")
+    ws2.freeze_panes = "B2"
     section_order = analysis.get("section_order", {})
-    q_labels = [_page_label(p) for p in qualifying]
     consensus = analysis.get("consensus_order", [])
-    ws2.cell(row=1, column=1, value="Position")
-    for c, lbl in enumerate(q_labels, 2):
-        ws2.cell(row=1, column=c, value=lbl).font = Font(bold=True)
-    ws2.cell(row=1, column=len(q_labels) + 2, value="Consensus Order").font = Font(bold=True)
-    for i, pos in enumerate(sorted(section_order.keys()), 2):
-        ws2.cell(row=i, column=1, value=f"{pos}st H2")
+    ws2.append(["Position"] + _header_cells(ws2, q_labels + ["Consensus Order"]))
+    for pos in sorted(section_order.keys()):
         row_data = section_order[pos]
-        vals = list(row_data.values())
-        for c, lbl in enumerate(q_labels, 2):
+        counts = Counter(row_data.values())
+        row = [f"{pos}st H2"]
+        for lbl in q_labels:
             val = row_data.get(lbl, "")
-            cell = ws2.cell(row=i, column=c, value=val)
-            if vals.count(val) >= 3 or (val and sum(1 for v in vals if v == val) >= 3):
-                cell.fill = LIGHT_BLUE_FILL
+            style = "Consensus" if val and counts[val] >= 3 else None
+            row.append(_styled_cell(ws2, val, style))
         if pos - 1 < len(consensus):
-            ws2.cell(row=i, column=len(q_labels) + 2, value=consensus[pos - 1])
-    ws2.freeze_panes = "B2"
+            row.append(consensus[pos - 1])
+        ws2.append(row)
 
     # --- Tab 2b: Section Word Counts (all pages including Homepages for LLM classification) ---
-    ws_swc = wb.create_sheet("Section Word Counts")
-    swc_headers = ["Page", "Position", "H2 Text", "Word Count", "Context Snippet", "Page Type"]
-    for c, h in enumerate(swc_headers, 1):
-        ws_swc.cell(row=1, column=c, value=h).font = Font(bold=True)
-    row_num = 2
-    for p in pages:
-        page_label = _page_label(p)
-        page_type = p.get("page_type", "")
-        for sec in p.get("section_word_counts", []):
-            ws_swc.cell(row=row_num, column=1, value=page_label)
-            ws_swc.cell(row=row_num, column=2, value=sec.get("position", ""))
-            ws_swc.cell(row=row_num, column=3, value=sec.get("h2_text", ""))
-            ws_swc.cell(row=row_num, column=4, value=sec.get("word_count", 0))
-            ws_swc.cell(row=row_num, column=5, value=sec.get("context_snippet", ""))
-            ws_swc.cell(row=row_num, column=6, value=page_type)
-            row_num += 1
-    ws_swc.freeze_panes = "B2"
+    # Skipped when no page has section word counts (e.g. a failed scrape run)
+    if any(p.get("section_word_counts") for p in pages):
+        ws_swc = wb.create_sheet("Section Word Counts")
+        ws_swc.freeze_panes = "B2"
+        ws_swc.append(_header_cells(ws_swc, SWC_HEADERS))
+        for p, base, _, label in page_rows:
+            page_type = base[3]
+            for sec in p.get("section_word_counts", []):
+                ws_swc.append([
+                    label,
+                    sec.get("position", ""),
+                    sec.get("h2_text", ""),
+                    sec.get("word_count", 0),
+                    sec.get("context_snippet", ""),
+                    page_type,
+                ])
 
     # --- Tab 2c: Section Type Reference (for LLM classification) ---
     _add_section_type_reference_sheet(wb)
 
     # --- Tab 3: Authority Profile ---
     ws3 = wb.create_sheet("Authority Profile")
-    auth_headers = [
-        "City", "Position", "URL", "Page Type", "Classification Confidence",
-        "Domain Rating", "URL Rating", "Referring Domains", "Backlinks",
-        "Organic Traffic", "Content Richness Score", "Diagnosis",
-        "Ranking Driver", "Ranking Driver Note", "Notes",
-    ]
-    for c, h in enumerate(auth_headers, 1):
-        ws3.cell(row=1, column=c, value=h).font = Font(bold=True)
-    for r, p in enumerate(pages, 2):
-        notes = []
-        if p.get("page_type") == "Homepage":
-            notes.append("Homepage ranking — authority driven")
-        if p.get("page_type") == "Geo Page":
-            notes.append("Geo page ranking — different intent")
-        if p.get("js_rendering_flagged"):
-            notes.append("⚠️ May require JS rendering")
-        notes_str = " ".join(notes)
-        row_data = [
-            p.get("city", ""),
-            p.get("position", ""),
-            p.get("url", "")[:80],
-            p.get("page_type", ""),
+    ws3.freeze_panes = "B2"
+    _set_url_column_width(ws3, AUTH_HEADERS)
+    ws3.append(_header_cells(ws3, AUTH_HEADERS))
+    diagnosis_cells = _styled_cells(ws3, DIAGNOSIS_STYLES)
+    driver_cells = _styled_cells(ws3, RANKING_DRIVER_STYLES)
+    for p, base, _, _ in page_rows:
+        js_flagged = bool(p.get("js_rendering_flagged"))
+        notes_str = AUTHORITY_NOTES.get((base[3], js_flagged), JS_RENDERING_NOTE if js_flagged else "")
+        diag = p.get("diagnosis", "")
+        drv = p.get("ranking_driver", "")
+        ws3.append([
+            *base,
             p.get("page_type_confidence", ""),
             str(p.get("domain_rating", "")),
             str(p.get("url_rating", "")),
@@ -287,156 +469,92 @@ def build_excel(
             str(p.get("backlinks", "")),
             str(p.get("organic_traffic", "")),
             p.get("content_richness_score", ""),
-            p.get("diagnosis", ""),
-            p.get("ranking_driver", ""),
-            p.get("ranking_driver_note", "")[:120],
+            diagnosis_cells.get(diag, diag),  # Diagnosis column
+            driver_cells.get(drv, drv),  # Ranking Driver column
+            p.get("ranking_driver_note", ""),
             notes_str,
-        ]
-        for c, val in enumerate(row_data, 1):
-            cell = ws3.cell(row=r, column=c, value=val)
-            if c == 12:  # Diagnosis column
-                diag = p.get("diagnosis", "")
-                if diag in DIAGNOSIS_FILLS:
-                    cell.fill = DIAGNOSIS_FILLS[diag]
-            if c == 13:  # Ranking Driver column
-                drv = p.get("ranking_driver", "")
-                if drv in RANKING_DRIVER_FILLS:
-                    cell.fill = RANKING_DRIVER_FILLS[drv]
-    ws3.freeze_panes = "B2"
+        ])
 
     # --- Tab 4: Above The Fold — Mobile ---
     ws4 = wb.create_sheet("Above The Fold - Mobile")
-    atf_headers = [
-        "City", "Position", "URL", "Page Type", "Hero Headline", "Hero Subheadline",
-        "Primary CTA Text", "CTA Location", "Has Trust Badge in Hero", "Has Video in Hero",
-        "Has Background Image", "First Impression Summary",
-    ]
-    for c, h in enumerate(atf_headers, 1):
-        ws4.cell(row=1, column=c, value=h).font = Font(bold=True)
-    for r, p in enumerate(pages, 2):
+    ws4.freeze_panes = "B2"
+    _set_url_column_width(ws4, ATF_HEADERS)
+    ws4.append(_header_cells(ws4, ATF_HEADERS))
+    for p, base, _, _ in page_rows:
         af = p.get("above_fold_mobile", {})
         summary = f"Headline: {af.get('headline', '')[:50]}..."
-        row_data = [
-            p.get("city", ""),
-            p.get("position", ""),
-            (p.get("url", "") or "")[:60],
-            p.get("page_type", ""),
+        ws4.append([
+            *base,
             af.get("headline", ""),
-            af.get("subheadline", "")[:100] if af.get("subheadline") else "",
+            af.get("subheadline") or "",
             af.get("cta_text", ""),
             "in hero" if af.get("cta_text") else "",
             "Yes" if af.get("has_trust_badge") else "No",
             "Yes" if af.get("has_video") else "No",
             "Yes" if af.get("has_background_image") else "No",
             summary,
-        ]
-        for c, val in enumerate(row_data, 1):
-            ws4.cell(row=r, column=c, value=val)
-    ws4.freeze_panes = "B2"
+        ])
 
     # --- Tab 5: Section Intelligence ---
-    ws5 = wb.create_sheet("Section Intelligence")
-    si_headers = [
-        "Section Topic", "Pages Containing It", "Position 1 Pages That Include It",
-        "Typical Position on Page", "Estimated Word Count Range", "Wireframe Recommendation",
-    ]
-    for c, h in enumerate(si_headers, 1):
-        ws5.cell(row=1, column=c, value=h).font = Font(bold=True)
-    si_key_map = {
-        "Section Topic": "section_topic",
-        "Pages Containing It": "pages_containing",
-        "Position 1 Pages That Include It": "position_1_include",
-        "Typical Position on Page": "typical_position",
-        "Estimated Word Count Range": "word_count_range",
-        "Wireframe Recommendation": "wireframe_recommendation",
-    }
-    for r, si in enumerate(analysis.get("section_intelligence", []), 2):
-        for c, header in enumerate(si_headers, 1):
-            k = si_key_map.get(header, header)
-            ws5.cell(row=r, column=c, value=si.get(k, ""))
-    ws5.freeze_panes = "B2"
+    # Skipped when the analysis found no section topics
+    section_intelligence = analysis.get("section_intelligence")
+    if section_intelligence:
+        ws5 = wb.create_sheet("Section Intelligence")
+        ws5.freeze_panes = "B2"
+        ws5.append(_header_cells(ws5, SI_HEADERS))
+        for si in section_intelligence:
+            ws5.append([si.get(k, "") for k in SI_KEYS])
 
     # --- Tab 6: Technology & Differentiation ---
     ws6 = wb.create_sheet("Technology & Differentiation")
-    td_headers = [
-        "City", "Position", "URL", "Page Type", "Technologies Mentioned",
-        "Credential Claims", "Statistical Claims", "Financing Mentioned", "Unique Differentiators",
-    ]
-    for c, h in enumerate(td_headers, 1):
-        ws6.cell(row=1, column=c, value=h).font = Font(bold=True)
-    for r, p in enumerate(pages, 2):
-        ce = p.get("content_elements", {})
+    ws6.freeze_panes = "B2"
+    _set_url_column_width(ws6, TD_HEADERS)
+    ws6.append(_header_cells(ws6, TD_HEADERS))
+    for p, base, ce, _ in page_rows:
         tech = ce.get("technology_names", {})
         tech_list = tech.get("found", []) if isinstance(tech, dict) else []
         cred = ce.get("surgeon_credentials", {})
-        cred_text = cred.get("exact_text", "")[:200] if isinstance(cred, dict) else ""
+        cred_text = cred.get("exact_text", "") if isinstance(cred, dict) else ""
         stats = ce.get("outcome_statistics", {})
         claims = stats.get("claims", []) if isinstance(stats, dict) else []
         fin = ce.get("financing", {})
         fin_yes = fin.get("present", False) if isinstance(fin, dict) else False
-        row_data = [
-            p.get("city", ""),
-            p.get("position", ""),
-            (p.get("url", "") or "")[:60],
-            p.get("page_type", ""),
+        ws6.append([
+            *base,
             ", ".join(tech_list) if tech_list else "",
             cred_text,
             " | ".join(claims[:3]) if claims else "",
             "Yes" if fin_yes else "No",
             "",
-        ]
-        for c, val in enumerate(row_data, 1):
-            ws6.cell(row=r, column=c, value=val)
-    ws6.freeze_panes = "B2"
+        ])
 
     # --- Tab 7: Page Type Summary ---
     ws7 = wb.create_sheet("Page Type Summary")
-    pt_headers = [
-        "City", "Position", "URL", "Detected Page Type", "Classification Confidence",
-        "URL Signal", "Content Signal", "Final Classification", "Wireframe Weight", "Notes",
-    ]
-    for c, h in enumerate(pt_headers, 1):
-        ws7.cell(row=1, column=c, value=h).font = Font(bold=True)
-    for r, p in enumerate(pages, 2):
-        notes = []
-        if p.get("js_rendering_flagged"):
-            notes.append("⚠️ May require JS rendering")
-        if p.get("page_type") == "Homepage" and config.get("flag_homepages"):
-            notes.append("Homepage ranking — domain authority likely the primary ranking factor")
-        row_data = [
-            p.get("city", ""),
-            p.get("position", ""),
-            (p.get("url", "") or "")[:60],
-            p.get("page_type", ""),
+    ws7.freeze_panes = "B2"
+    _set_url_column_width(ws7, PT_HEADERS)
+    ws7.append(_header_cells(ws7, PT_HEADERS))
+    flag_homepages = bool(config.get("flag_homepages"))
+    for p, base, _, _ in page_rows:
+        notes_key = (bool(p.get("js_rendering_flagged")), flag_homepages and base[3] == "Homepage")
+        ws7.append([
+            *base,
             p.get("page_type_confidence", ""),
             p.get("url_signal", p.get("page_type_prelim", "")),
             p.get("content_signal", ""),
-            p.get("page_type", ""),
+            base[3],
             p.get("wireframe_weight", ""),
-            " ".join(notes),
-        ]
-        for c, val in enumerate(row_data, 1):
-            ws7.cell(row=r, column=c, value=val)
-    ws7.freeze_panes = "B2"
+            PAGE_TYPE_NOTES[notes_key],
+        ])
 
     # --- Tab 8: Raw Data ---
     ws8 = wb.create_sheet("Raw Data")
-    raw_headers = [
-        "city", "position", "url", "page_type", "page_title", "meta_description",
-        "h1", "word_count", "domain_rating", "url_rating", "content_richness_score", "diagnosis",
-        "js_rendering_flagged", "scrape_failed", "faq", "testimonials", "surgeon_credentials",
-        "technology", "online_scheduling", "outcome_stats",
-    ]
-    for c, h in enumerate(raw_headers, 1):
-        ws8.cell(row=1, column=c, value=h).font = Font(bold=True)
-    for r, p in enumerate(pages, 2):
-        ce = p.get("content_elements", {})
+    ws8.freeze_panes = "B2"
+    ws8.append(_header_cells(ws8, RAW_HEADERS))
+    raw_rows = []
+    for p, base, ce, _ in page_rows:
         struct = p.get("structure", {})
-        row_data = [
-            p.get("city", ""),
-            p.get("position", ""),
-            p.get("url", ""),
-            p.get("page_type", ""),
+        raw_rows.append([
+            *base,
             p.get("page_title", ""),
             p.get("meta_description", ""),
             struct.get("h1", ""),
@@ -453,10 +571,13 @@ def build_excel(
             ",".join((ce.get("technology_names") or {}).get("found", [])),
             "Yes" if (ce.get("online_scheduling") or {}).get("present") else "No",
             "Yes" if (ce.get("outcome_statistics") or {}).get("present") else "No",
-        ]
-        for c, val in enumerate(row_data, 1):
-            ws8.cell(row=r, column=c, value=val)
-    ws8.freeze_panes = "B2"
-
-    wb.save(output_path)
+        ])
+    # Raw Data is the largest tab and holds only plain values, so its rows are
+    # rendered straight to XML and spliced in at save time.
+    raw_xml = _rows_xml(raw_rows, first_row=2)
+    if raw_xml is None:
+        for row in raw_rows:
+            ws8.append(row)
+
+    _save_workbook(wb, output_path, {ws8: raw_xml} if raw_xml else None)
     return output_path
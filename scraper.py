@@ -3,21 +3,43 @@ Page Structure Comparison Tool - Scraper Module
 Scrapes URLs and extracts structure, content elements, and above-the-fold data.
 """
 
+import hashlib
 import re
+import threading
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional
 from urllib.parse import urljoin, urlparse
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+from requests.adapters import HTTPAdapter
+
+try:
+    import ahocorasick  # optional: pip install pyahocorasick
+except ImportError:
+    ahocorasick = None
+
+PROJECT_ROOT = Path(__file__).parent.resolve()
+# Successful scrapes are cached here for config["scrape_cache_hours"] (0 or missing = no cache)
+SCRAPE_CACHE_DIR = PROJECT_ROOT / "data" / "scrape_cache"
+SCRAPE_CACHE_VERSION = 1  # bump when extraction changes so older cached results are ignored
 
 # Realistic browser user agent
 USER_AGENT = (
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
     "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 )
-REQUEST_DELAY_SECONDS = 2
+REQUEST_DELAY_SECONDS = 2  # minimum gap between requests to the same domain
+HTTP_POOL_SIZE = 16
+SCRAPE_MAX_WORKERS = 8
+CTA_TEXTS_LIMIT = 32  # unique link/button texts kept per page
+JS_RENDERING_MIN_WORDS = 200  # fewer visible words: flag as likely JS-rendered, extract headings only
+EMPTY_PAGE_MAX_WORDS = 50  # fewer visible words: nothing worth extracting at all
 
 # Elements to exclude from visible text (nav, header, footer, etc.)
 EXCLUDE_SELECTORS = [
@@ -26,18 +48,174 @@ EXCLUDE_SELECTORS = [
     ".cookie-banner", ".cookie-consent", "#cookie",
     "script", "style", "noscript", "iframe",
 ]
+# One selector list, so the tree is matched in a single pass (soupsieve caches the compiled selector)
+_EXCLUDE_COMBINED = ", ".join(EXCLUDE_SELECTORS)
+
+_HERO_CLS_RE = re.compile(r"hero|banner|header", re.I)
+_VIDEO_TESTIMONIAL_CLS_RE = re.compile(r"video.*testimonial|testimonial.*video", re.I)
+_QMARK_RE = re.compile(r"\?")
+# Outcome statistics - patterns for exact claims ("98% of patients...", "over 25,000 procedures").
+# Run separately: in one alternation the lazy "...20/20" pattern would swallow other claims.
+_STAT_PATTERNS = tuple(
+    re.compile(p, re.I)
+    for p in (
+        r"\d+%\s+of\s+patients.*?(?:\.|achieved|vision)",
+        r"\d+\%\s+.*?20/20",
+        r"over\s+\d+,?\d*\s+procedures",
+        r"\d+\+\s+years",
+    )
+)
+STAT_CLAIMS_LIMIT = 5
+
+# Visible-text signals per content element; the first signal (in list order) found sets the position
+FAQ_SIGNALS = ("faq", "frequently asked", "common questions", "q&a", "questions and answers")
+TESTIMONIAL_SIGNALS = ("testimonial", "review", "patient story", "what our patients", "google reviews", "realself", "healthgrades")
+COST_SIGNALS = ("cost", "price", "pricing", "$", "affordable", "investment", "financing")
+QUIZ_SIGNALS = ("candidate", "candidacy", "quiz", "self-test", "am i a candidate", "find out if")
+BEFORE_AFTER_SIGNALS = ("before and after", "before & after", "before/after", "results gallery")
+FINANCING_SIGNALS = ("financing", "payment plan", "carecredit", "afford", "monthly")
+TRUST_SIGNALS = ("certified", "accredited", "award", "top doctor", "best of")
+PRESS_SIGNALS = ("as seen in", "featured in", "press", "media")
+SCHEDULING_SIGNALS = ("schedule online", "book online", "online scheduling", "schedule your")
+RATING_SIGNALS = ("star", "rating")
+CREDENTIAL_SIGNALS = ("fellowship", "years of experience", "board certified", "procedure count", "surgeon", "dr.", "md", "credentials")
+# Hero area: CTA class names, CTA link wording, trust wording in the first block of body HTML
+CTA_CLASS_TOKENS = ("btn", "button", "cta", "schedule", "consult")
+_CTA_CLASS_RE = re.compile("|".join(map(re.escape, CTA_CLASS_TOKENS)), re.I | re.A)
+CTA_LINK_WORDS = ("schedule", "consult", "book", "get started", "learn more")
+HERO_TRUST_SIGNALS = ("certified", "accredited", "award", "years", "board", " fellowship", "md", "do")
+TEXT_SIGNALS = tuple(dict.fromkeys(
+    FAQ_SIGNALS + TESTIMONIAL_SIGNALS + COST_SIGNALS + QUIZ_SIGNALS + BEFORE_AFTER_SIGNALS
+    + FINANCING_SIGNALS + TRUST_SIGNALS + PRESS_SIGNALS + SCHEDULING_SIGNALS + RATING_SIGNALS
+    + ("video testimonial",)
+))
+
+
+@lru_cache(maxsize=32)
+def _signal_automaton(signals: tuple[str, ...]):
+    """Aho-Corasick automaton over a signal list, or None if unavailable."""
+    if ahocorasick is None or not signals or "" in signals:
+        return None
+    auto = ahocorasick.Automaton()
+    for s in signals:
+        auto.add_word(s, s)
+    auto.make_automaton()
+    return auto
+
+
+def _signal_offsets(signals: tuple[str, ...], text: str) -> dict:
+    """Map each signal found in text to the offset of its first occurrence."""
+    auto = _signal_automaton(signals)
+    offsets = {}
+    if auto is None:
+        for s in signals:
+            idx = text.find(s)
+            if idx >= 0:
+                offsets[s] = idx
+        return offsets
+    # Single linear scan; hits come in order of end offset, so the first hit per signal is its earliest
+    for end, s in auto.iter(text):
+        if s not in offsets:
+            offsets[s] = end - len(s) + 1
+    return offsets
+
+
+def _new_session() -> requests.Session:
+    """Session with keep-alive connection pools, so pages on the same host share TCP/TLS setup."""
+    session = requests.Session()
+    session.headers.update({"User-Agent": USER_AGENT})
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_default_session: Optional[requests.Session] = None
+_default_session_lock = threading.Lock()
+
+
+def _get_default_session() -> requests.Session:
+    """Shared session for scrape_single_url calls made without one (created on first use)."""
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = _new_session()
+        return _default_session
+
+
+# Every extractor reads <body>; <head> only matters to the widget/embed substring checks, which use the raw HTML
+_BODY_STRAINER = SoupStrainer("body")
+
+
+def _parse_html(html: str) -> BeautifulSoup:
+    """Parse page HTML into the tree every extractor below works on (the <body> subtree only)."""
+    soup = BeautifulSoup(html, "lxml", parse_only=_BODY_STRAINER)
+    if soup.body is None:
+        # No <body> at all (e.g. truncated head-only markup): keep the whole document, as before
+        return BeautifulSoup(html, "lxml")
+    return soup
+
+
+# Tag groups the hero/content extractors read, so one tree walk can bucket them (document order kept per group)
+_TAG_GROUPS = {
+    "a": "a_button", "button": "a_button",
+    "video": "media", "iframe": "media",
+    "p": "blocks", "div": "blocks", "span": "blocks", "li": "blocks",
+    "details": "details",
+    "h1": "h1",
+}
+
+
+def _index_tags(soup: BeautifulSoup) -> dict:
+    """
+    Walk the tree once and bucket tags by _TAG_GROUPS, plus every tag with a style
+    ("styled") or class ("classed") attribute. Each list is in document order.
+    """
+    index = {group: [] for group in set(_TAG_GROUPS.values())}
+    styled = index["styled"] = []
+    classed = index["classed"] = []
+    groups = _TAG_GROUPS
+    for el in soup.descendants:
+        if not isinstance(el, Tag):
+            continue
+        group = groups.get(el.name)
+        if group is not None:
+            index[group].append(el)
+        attrs = el.attrs
+        if "style" in attrs:
+            styled.append(el)
+        if "class" in attrs:
+            classed.append(el)
+    return index
+
+
+def _html_prefix(tag: Tag, length: int) -> str:
+    """str(tag)[:length], serializing only the children needed to fill the first `length` chars."""
+    close = f"</{tag.name}>"
+    # Opening tag (name + formatted attributes) from an empty copy of the tag
+    parts = [str(Tag(name=tag.name, attrs=tag.attrs))[:-len(close)]]
+    size = len(parts[0])
+    for child in tag.contents:
+        if size >= length:
+            break
+        markup = child.decode() if isinstance(child, Tag) else child.output_ready()
+        parts.append(markup)
+        size += len(markup)
+    else:
+        parts.append(close)
+    return "".join(parts)[:length]
 
 
 def _get_visible_text(soup: BeautifulSoup, exclude_selectors: Optional[List[str]] = None) -> str:
     """Extract visible text, excluding nav/header/footer/cookie banners."""
-    selectors = exclude_selectors or EXCLUDE_SELECTORS
-    work = soup.select_one("body") or soup
+    combined = ", ".join(exclude_selectors) if exclude_selectors else _EXCLUDE_COMBINED
+    work = soup.body or soup
     if not work:
         return ""
 
-    # Clone and remove excluded elements
-    for sel in selectors:
-        for el in work.select(sel):
+    # Remove excluded elements (matches nested in an already-removed element are skipped)
+    for el in work.select(combined):
+        if not el.decomposed:
             el.decompose()
     return work.get_text(separator=" ", strip=True)
 
@@ -65,8 +243,9 @@ def _is_internal_link(href: str, base_domain: str) -> bool:
         return False
 
 
+@lru_cache(maxsize=4096)
 def _get_domain(url: str) -> str:
-    """Extract domain from URL."""
+    """Extract domain from URL (cached: link-heavy pages repeat the same few hosts)."""
     parsed = urlparse(url)
     netloc = parsed.netloc or ""
     if netloc.startswith("www."):
@@ -86,10 +265,11 @@ def _detect_element_position(word_count_total: int, element_position_chars: int)
     return "late"
 
 
-def _extract_above_fold_mobile(soup: BeautifulSoup, visible_text: str) -> dict:
+def _extract_above_fold_mobile(soup: BeautifulSoup, visible_text: str, tags: Optional[dict] = None) -> dict:
     """
     Simulate mobile viewport (390px) - heuristic approach.
     Hero = first substantial content block (before scroll).
+    tags is the _index_tags(soup) result, if the caller already has it.
     """
     hero = {
         "headline": "",
@@ -99,14 +279,15 @@ def _extract_above_fold_mobile(soup: BeautifulSoup, visible_text: str) -> dict:
         "has_background_image": False,
         "has_trust_badge": False,
     }
-    body = soup.select_one("body")
+    body = soup.body
     if not body:
         return hero
+    if tags is None:
+        tags = _index_tags(soup)
 
     # Look for hero-like structures: first h1, first section, first .hero, etc.
-    h1 = soup.find("h1")
-    if h1:
-        hero["headline"] = h1.get_text(strip=True)
+    if tags["h1"]:
+        hero["headline"] = tags["h1"][0].get_text(strip=True)
 
     # First substantial paragraph or div after h1
     candidates = body.find_all(["p", "h2", "div"], limit=20)
@@ -117,43 +298,47 @@ def _extract_above_fold_mobile(soup: BeautifulSoup, visible_text: str) -> dict:
                 hero["subheadline"] = text[:200]
             break
 
-    # CTA buttons in first 1500 chars of HTML (roughly above fold)
-    html_str = str(body)[:3000]
-    for a in soup.find_all(["a", "button"]):
-        cls = " ".join(a.get("class", []))
+    # CTA buttons (first styled button/link, else first CTA-worded link)
+    for a in tags["a_button"]:
+        if not _CTA_CLASS_RE.search(" ".join(a.get("class", ()))):
+            continue
         text = a.get_text(strip=True)
-        if text and any(x in cls.lower() for x in ["btn", "button", "cta", "schedule", "consult"]):
+        if text:
             hero["cta_text"] = hero["cta_text"] or text
             break
     if not hero["cta_text"]:
-        for a in soup.find_all("a", href=True):
+        for a in tags["a_button"]:
+            if a.name != "a" or "href" not in a.attrs:
+                continue
             text = a.get_text(strip=True)
-            if text and len(text) < 50 and any(w in text.lower() for w in ["schedule", "consult", "book", "get started", "learn more"]):
+            text_lower = text.lower()
+            if text and len(text) < 50 and any(w in text_lower for w in CTA_LINK_WORDS):
                 hero["cta_text"] = text
                 break
 
     # Video in hero area
-    for tag in soup.find_all(["video", "iframe"]):
+    for tag in tags["media"]:
         src = tag.get("src", "") or ""
         if "youtube" in src or "vimeo" in src or tag.name == "video":
             hero["has_video"] = True
             break
 
     # Background image
-    for tag in soup.find_all(style=True):
+    for tag in tags["styled"]:
         style = tag.get("style", "")
         if "background-image" in style or "background:" in style:
             hero["has_background_image"] = True
             break
-    for tag in soup.find_all(class_=re.compile(r"hero|banner|header", re.I)):
+    for tag in tags["classed"]:
+        if not _HERO_CLS_RE.search(" ".join(tag["class"])):
+            continue
         if tag.get("style", "") or tag.find(["img", "video"]):
             hero["has_background_image"] = True
             break
 
     # Trust badge / credential in hero area
-    trust_patterns = ["certified", "accredited", "award", "years", "board", " fellowship", "md", "do"]
-    first_block = str(body)[:4000]
-    if any(p in first_block.lower() for p in trust_patterns):
+    first_block = _html_prefix(body, 4000).lower()
+    if any(p in first_block for p in HERO_TRUST_SIGNALS):
         hero["has_trust_badge"] = True
 
     return hero
@@ -164,12 +349,24 @@ def _extract_content_elements(
     visible_text: str,
     tech_keywords: List[str],
     base_url: str,
+    tags: Optional[dict] = None,
+    html_lower: Optional[str] = None,
+    word_total: Optional[int] = None,
 ) -> dict:
-    """Detect presence and position of content elements."""
+    """
+    Detect presence and position of content elements.
+    html_lower is the lowercased raw page HTML for the embed/widget checks (defaults to the serialized soup);
+    word_total is the visible text's word count, if the caller already has it.
+    """
+    if tags is None:
+        tags = _index_tags(soup)
     text_lower = visible_text.lower()
-    html_lower = str(soup).lower()
-    word_total = _word_count(visible_text)
+    if html_lower is None:
+        html_lower = str(soup).lower()
+    if word_total is None:
+        word_total = _word_count(visible_text)
     char_pos = 0
+    signal_offsets = _signal_offsets(TEXT_SIGNALS, text_lower)
 
     def position_for_text(search: str) -> str:
         idx = text_lower.find(search.lower())
@@ -177,6 +374,9 @@ def _extract_content_elements(
             return "mid"
         return _detect_element_position(word_total, idx)
 
+    def position_for_signal(signal: str) -> str:
+        return _detect_element_position(word_total, signal_offsets[signal])
+
     elements = {
         "cta_buttons": {"present": False, "position": "", "texts": []},
         "video_embed": {"present": False, "position": ""},
@@ -197,88 +397,90 @@ def _extract_content_elements(
         "video_testimonials": {"present": False, "position": "", "count": 0},
     }
 
-    # CTA buttons
-    for a in soup.find_all(["a", "button"]):
+    # CTA buttons (unique texts in page order; repeated nav CTAs are kept once)
+    cta_texts = {}
+    for a in tags["a_button"]:
         t = a.get_text(strip=True)
         if t and 3 < len(t) < 80:
-            elements["cta_buttons"]["texts"].append(t)
+            cta_texts.setdefault(t, None)
+            if len(cta_texts) >= CTA_TEXTS_LIMIT:
+                break
+    elements["cta_buttons"]["texts"] = list(cta_texts)
     if elements["cta_buttons"]["texts"]:
         elements["cta_buttons"]["present"] = True
         elements["cta_buttons"]["position"] = position_for_text(elements["cta_buttons"]["texts"][0])
 
     # Video embed
-    if "youtube" in html_lower or "vimeo" in html_lower or soup.find("video"):
+    if "youtube" in html_lower or "vimeo" in html_lower or any(tag.name == "video" for tag in tags["media"]):
         elements["video_embed"]["present"] = True
         elements["video_embed"]["position"] = "mid"
 
     # FAQ - common patterns
-    faq_patterns = ["faq", "frequently asked", "common questions", "q&a", "questions and answers"]
-    for p in faq_patterns:
-        if p in text_lower:
+    for p in FAQ_SIGNALS:
+        if p in signal_offsets:
             elements["faq_section"]["present"] = True
-            elements["faq_section"]["position"] = position_for_text(p)
+            elements["faq_section"]["position"] = position_for_signal(p)
             # Count questions (rough)
-            elements["faq_section"]["count"] = len(re.findall(r"\?", visible_text))
+            elements["faq_section"]["count"] = len(_QMARK_RE.findall(visible_text))
             break
     # Also check for details/summary or accordion
-    if soup.find_all(["details", "[data-faq]", ".faq"]):
+    if tags["details"]:
         elements["faq_section"]["present"] = True
-        elements["faq_section"]["count"] = max(elements["faq_section"]["count"], len(soup.find_all("details")))
+        elements["faq_section"]["count"] = max(elements["faq_section"]["count"], len(tags["details"]))
 
     # Testimonials
-    testimonial_signals = ["testimonial", "review", "patient story", "what our patients", "google reviews", "realself", "healthgrades"]
-    for s in testimonial_signals:
-        if s in text_lower:
+    for s in TESTIMONIAL_SIGNALS:
+        if s in signal_offsets:
             elements["testimonials"]["present"] = True
-            elements["testimonials"]["position"] = position_for_text(s)
-            if "video" in s or soup.find_all(class_=re.compile("video.*testimonial|testimonial.*video", re.I)):
+            elements["testimonials"]["position"] = position_for_signal(s)
+            if "video" in s or any(_VIDEO_TESTIMONIAL_CLS_RE.search(" ".join(tag["class"])) for tag in tags["classed"]):
                 elements["testimonials"]["type"] = "video"
             elif "google" in s or "realself" in s or "healthgrades" in s:
                 elements["testimonials"]["type"] = "third-party embed"
-            elif "star" in text_lower or "rating" in text_lower:
+            elif any(r in signal_offsets for r in RATING_SIGNALS):
                 elements["testimonials"]["type"] = "star rating widget"
             else:
                 elements["testimonials"]["type"] = "text quote"
             break
 
     # Cost/pricing
-    cost_signals = ["cost", "price", "pricing", "$", "affordable", "investment", "financing"]
-    for s in cost_signals:
-        if s in text_lower:
+    for s in COST_SIGNALS:
+        if s in signal_offsets:
             elements["cost_pricing"]["present"] = True
-            elements["cost_pricing"]["position"] = position_for_text(s)
+            elements["cost_pricing"]["position"] = position_for_signal(s)
             break
 
     # Candidacy quiz
-    quiz_signals = ["candidate", "candidacy", "quiz", "self-test", "am i a candidate", "find out if"]
-    for s in quiz_signals:
-        if s in text_lower:
+    for s in QUIZ_SIGNALS:
+        if s in signal_offsets:
             elements["candidacy_quiz"]["present"] = True
-            elements["candidacy_quiz"]["position"] = position_for_text(s)
+            elements["candidacy_quiz"]["position"] = position_for_signal(s)
             break
 
     # Before/after
-    ba_signals = ["before and after", "before & after", "before/after", "results gallery"]
-    for s in ba_signals:
-        if s in text_lower:
+    for s in BEFORE_AFTER_SIGNALS:
+        if s in signal_offsets:
             elements["before_after_photos"]["present"] = True
-            elements["before_after_photos"]["position"] = position_for_text(s)
+            elements["before_after_photos"]["position"] = position_for_signal(s)
             break
 
     # Surgeon credentials - capture exact text
-    credential_signals = ["fellowship", "years of experience", "board certified", "procedure count", "surgeon", "dr.", "md", "credentials"]
-    for tag in soup.find_all(["p", "div", "span", "li"]):
+    for tag in tags["blocks"]:
         t = tag.get_text(strip=True)
-        if any(s in t.lower() for s in credential_signals) and 20 < len(t) < 500:
+        if not 20 < len(t) < 500:
+            continue
+        t_lower = t.lower()
+        if any(s in t_lower for s in CREDENTIAL_SIGNALS):
             elements["surgeon_credentials"]["present"] = True
             elements["surgeon_credentials"]["exact_text"] = (elements["surgeon_credentials"]["exact_text"] + " | " + t).strip(" | ")
             elements["surgeon_credentials"]["position"] = position_for_text(t[:50])
             break
 
     # Technology names from config
+    tech_offsets = _signal_offsets(tuple(kw.lower() for kw in tech_keywords), text_lower)
     found_tech = []
     for kw in tech_keywords:
-        if kw.lower() in text_lower or kw in visible_text:
+        if kw.lower() in tech_offsets or kw in visible_text:
             found_tech.append(kw)
     if found_tech:
         elements["technology_names"]["present"] = True
@@ -286,35 +488,38 @@ def _extract_content_elements(
         elements["technology_names"]["position"] = "mid"
 
     # Financing
-    fin_signals = ["financing", "payment plan", "carecredit", "afford", "monthly"]
-    for s in fin_signals:
-        if s in text_lower:
+    for s in FINANCING_SIGNALS:
+        if s in signal_offsets:
             elements["financing"]["present"] = True
-            elements["financing"]["position"] = position_for_text(s)
+            elements["financing"]["position"] = position_for_signal(s)
             break
 
-    # Outcome statistics - capture exact claim
-    stat_patterns = [
-        r"\d+%\s+of\s+patients.*?(?:\.|achieved|vision)",
-        r"\d+\%\s+.*?20/20",
-        r"over\s+\d+,?\d*\s+procedures",
-        r"\d+\+\s+years",
-    ]
-    for pat in stat_patterns:
-        for m in re.finditer(pat, visible_text, re.I):
-            elements["outcome_statistics"]["present"] = True
-            elements["outcome_statistics"]["claims"].append(m.group(0).strip())
-    elements["outcome_statistics"]["claims"] = list(set(elements["outcome_statistics"]["claims"]))[:5]
-    if elements["outcome_statistics"]["claims"]:
-        elements["outcome_statistics"]["position"] = position_for_text(elements["outcome_statistics"]["claims"][0])
+    # Outcome statistics - capture exact claims (distinct, in page order)
+    matches = sorted(
+        (m.start(), m.group(0).strip()) for pat in _STAT_PATTERNS for m in pat.finditer(visible_text)
+    )
+    claims = {}
+    for _, claim in matches:
+        claims.setdefault(claim, None)
+        if len(claims) >= STAT_CLAIMS_LIMIT:
+            break
+    first_claim_at = matches[0][0] if matches else -1
+    if claims:
+        elements["outcome_statistics"]["present"] = True
+        elements["outcome_statistics"]["claims"] = list(claims)
+        # The first claim's first occurrence is the first match, unless lowercasing shifted offsets
+        if len(text_lower) == len(visible_text):
+            elements["outcome_statistics"]["position"] = _detect_element_position(word_total, first_claim_at)
+        else:
+            elements["outcome_statistics"]["position"] = position_for_text(elements["outcome_statistics"]["claims"][0])
 
     # Trust badges
-    if any(x in text_lower for x in ["certified", "accredited", "award", "top doctor", "best of"]):
+    if any(x in signal_offsets for x in TRUST_SIGNALS):
         elements["trust_badges"]["present"] = True
         elements["trust_badges"]["position"] = "early"
 
     # Press / As seen in
-    if any(x in text_lower for x in ["as seen in", "featured in", "press", "media"]):
+    if any(x in signal_offsets for x in PRESS_SIGNALS):
         elements["press_mentions"]["present"] = True
         elements["press_mentions"]["position"] = "early"
 
@@ -323,7 +528,7 @@ def _extract_content_elements(
         elements["live_chat"]["present"] = True
 
     # Online scheduling
-    if any(x in text_lower for x in ["schedule online", "book online", "online scheduling", "schedule your"]):
+    if any(x in signal_offsets for x in SCHEDULING_SIGNALS):
         elements["online_scheduling"]["present"] = True
         elements["online_scheduling"]["position"] = "mid"
 
@@ -332,24 +537,32 @@ def _extract_content_elements(
         elements["google_review_widget"]["present"] = True
 
     # Video testimonials count
-    if elements["testimonials"]["type"] == "video" or "video testimonial" in text_lower:
+    if elements["testimonials"]["type"] == "video" or "video testimonial" in signal_offsets:
         elements["video_testimonials"]["present"] = True
         elements["video_testimonials"]["count"] = text_lower.count("video")  # rough
 
     return elements
 
 
-def _extract_internal_links(soup: BeautifulSoup, page_url: str) -> List[dict]:
+def _extract_internal_links(soup: BeautifulSoup, page_url: str, tags: Optional[dict] = None) -> List[dict]:
     """List internal links with anchor text."""
     base_domain = _get_domain(page_url)
     links = []
     seen = set()
-    for a in soup.find_all("a", href=True):
+    anchors = soup.find_all("a", href=True) if tags is None else [
+        a for a in tags["a_button"] if a.name == "a" and "href" in a.attrs
+    ]
+    for a in anchors:
         href = a.get("href", "").strip()
         if not href or href.startswith("#") or href.startswith("javascript:"):
             continue
         full_url = urljoin(page_url, href)
-        if not _is_internal_link(href, base_domain) and _get_domain(full_url) != base_domain:
+        # Root-relative hrefs are internal; only other hrefs need their host parsed
+        if (
+            not href.startswith("/")
+            and not _is_internal_link(href, base_domain)
+            and _get_domain(full_url) != base_domain
+        ):
             continue
         anchor = a.get_text(strip=True)
         key = (full_url, anchor)
@@ -360,33 +573,25 @@ def _extract_internal_links(soup: BeautifulSoup, page_url: str) -> List[dict]:
 
 
 def _extract_structure(soup: BeautifulSoup) -> dict:
-    """Extract H1, H2s, H3s in document order."""
-    h1_text = ""
-    h1 = soup.find("h1")
-    if h1:
-        h1_text = h1.get_text(strip=True)
-
+    """Extract H1, H2s, H3s in document order (one pass over the headings)."""
+    h1_text = None
     h2s = []
-    for h2 in soup.find_all("h2"):
-        h2s.append({"text": h2.get_text(strip=True), "h3s": []})
-    # Group H3s under preceding H2
-    for h3 in soup.find_all("h3"):
-        parent = None
-        for sib in h3.find_previous_siblings():
-            if sib.name == "h2":
-                parent = sib.get_text(strip=True)
-                break
-            if sib.name == "h3":
-                break
-        for h2_entry in h2s:
-            if h2_entry["text"] == parent or not parent:
-                h2_entry["h3s"].append(h3.get_text(strip=True))
-                break
+    h3s = []
+    leading_h3s = []  # H3s before the first H2 are grouped under the first H2
+    current = leading_h3s
+    for tag in soup.find_all(["h1", "h2", "h3"]):
+        name = tag.name
+        if name == "h1":
+            if h1_text is None:
+                h1_text = tag.get_text(strip=True)
+        elif name == "h2":
+            current = leading_h3s if not h2s else []
+            h2s.append({"text": tag.get_text(strip=True), "h3s": current})
         else:
-            if h2s:
-                h2s[-1]["h3s"].append(h3.get_text(strip=True))
-
-    return {"h1": h1_text, "h2s": h2s, "h3s": [h.get_text(strip=True) for h in soup.find_all("h3")]}
+            text = tag.get_text(strip=True)
+            h3s.append(text)
+            current.append(text)
+    return {"h1": h1_text or "", "h2s": h2s, "h3s": h3s}
 
 
 SECTION_SNIPPET_LENGTH = 400  # chars of context for LLM section-type classification
@@ -435,15 +640,99 @@ def _extract_procedure_section(soup: BeautifulSoup, procedure: str) -> Optional[
     return None
 
 
+def _scrape_cache_path(url: str, config: dict, page_type_prelim: str) -> Path:
+    """Cache file for a URL, keyed on the config fields that change what gets extracted."""
+    key = orjson.dumps([
+        SCRAPE_CACHE_VERSION,
+        url,
+        page_type_prelim,
+        config.get("procedure", ""),
+        config.get("homepage_handling"),
+        config.get("technology_keywords", []),
+    ])
+    return SCRAPE_CACHE_DIR / f"{hashlib.blake2b(key, digest_size=16).hexdigest()}.json"
+
+
+def _read_scrape_cache(path: Path, max_age_seconds: float) -> Optional[dict]:
+    """Cached scrape result, or None if missing, expired or unreadable."""
+    try:
+        if time.time() - path.stat().st_mtime > max_age_seconds:
+            path.unlink(missing_ok=True)  # stale: drop it so the cache dir doesn't grow forever
+            return None
+        return orjson.loads(path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+
+def _write_scrape_cache(path: Path, result: dict) -> None:
+    """Store a scrape result (best effort: a failed write just means no cache hit next time)."""
+    tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_bytes(orjson.dumps(result))
+        tmp.replace(path)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+
+
+class _DomainThrottle:
+    """Spaces out request starts per domain; different domains are not delayed by each other."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._domain_locks = defaultdict(threading.Lock)
+        self._last_start = {}
+
+    def wait(self, url: str) -> None:
+        domain = _get_domain(url)
+        with self._lock:
+            domain_lock = self._domain_locks[domain]
+        with domain_lock:
+            last = self._last_start.get(domain)
+            if last is not None:
+                remaining = last + self.delay - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+            self._last_start[domain] = time.monotonic()
+
+
 def scrape_single_url(
     url: str,
     config: dict,
     page_type_prelim: str = "Service Page",
+    session: Optional[requests.Session] = None,
+    throttle: Optional[_DomainThrottle] = None,
 ) -> dict:
     """
     Scrape a single URL and return extracted data.
     Never crashes - returns error info on failure.
+    Pass a session to reuse its connections; otherwise a shared module session is used.
+    With config["scrape_cache_hours"] set, successful results are reused from disk for that long.
+    A throttle, if given, is only waited on when the URL is actually fetched (not on cache hits).
     """
+    cache_hours = config.get("scrape_cache_hours") or 0
+    if cache_hours <= 0:
+        return _scrape_page(url, config, page_type_prelim, session, throttle)
+
+    cache_path = _scrape_cache_path(url, config, page_type_prelim)
+    cached = _read_scrape_cache(cache_path, cache_hours * 3600)
+    if cached is not None:
+        return cached
+    result = _scrape_page(url, config, page_type_prelim, session, throttle)
+    if result["scraped"]:
+        _write_scrape_cache(cache_path, result)  # failures are always retried
+    return result
+
+
+def _scrape_page(
+    url: str,
+    config: dict,
+    page_type_prelim: str,
+    session: Optional[requests.Session],
+    throttle: Optional[_DomainThrottle] = None,
+) -> dict:
+    """Fetch and extract one URL (uncached; see scrape_single_url)."""
     tech_keywords = config.get("technology_keywords", [])
     procedure = config.get("procedure", "")
 
@@ -462,10 +751,11 @@ def scrape_single_url(
         "procedure_section": None,
     }
 
+    if throttle is not None:
+        throttle.wait(url)
     try:
-        resp = requests.get(
+        resp = (session or _get_default_session()).get(
             url,
-            headers={"User-Agent": USER_AGENT},
             timeout=15,
             allow_redirects=True,
         )
@@ -478,41 +768,52 @@ def scrape_single_url(
         result["error"] = str(e)
         return result
 
-    soup = BeautifulSoup(resp.text, "lxml")
+    html = resp.text
+    del resp  # drop the raw body bytes so only the decoded text is held while parsing
+    soup = _parse_html(html)
     visible_text = _get_visible_text(soup)
     word_count = _word_count(visible_text)
 
     result["word_count"] = word_count
-    if word_count < 200:
+    result["scraped"] = True
+    if word_count < JS_RENDERING_MIN_WORDS:
         result["js_rendering_flagged"] = True
+    if word_count < EMPTY_PAGE_MAX_WORDS:
+        # Next to no server-rendered text (JS app shell): skip all extraction
+        return result
 
     result["structure"] = _extract_structure(soup)
     result["section_word_counts"] = _extract_section_word_counts(soup)
-    result["above_fold_mobile"] = _extract_above_fold_mobile(soup, visible_text)
-    result["content_elements"] = _extract_content_elements(soup, visible_text, tech_keywords, url)
-    result["internal_links"] = _extract_internal_links(soup, url)
-    result["scraped"] = True
-
     if page_type_prelim == "Homepage" and config.get("homepage_handling") == "extract_section":
         result["procedure_section"] = _extract_procedure_section(soup, procedure)
+    if word_count < JS_RENDERING_MIN_WORDS:
+        # Thin page: headings are still informative, content/hero signals are not
+        return result
 
+    tags = _index_tags(soup)
+    result["above_fold_mobile"] = _extract_above_fold_mobile(soup, visible_text, tags)
+    result["content_elements"] = _extract_content_elements(
+        soup, visible_text, tech_keywords, url, tags, html.lower(), word_count
+    )
+    result["internal_links"] = _extract_internal_links(soup, url, tags)
     return result
 
 
 def scrape_urls(serp_results: List[dict], config: dict) -> List[dict]:
     """
-    Scrape all URLs from SERP results.
+    Scrape all URLs from SERP results (concurrently, in SERP order).
     Merges SERP data with scraped data per URL.
     """
-    pages = []
-    for i, row in enumerate(serp_results):
-        url = row.get("url", "")
-        if not url:
-            continue
-        page_type_prelim = row.get("page_type_prelim", "Service Page")
-        scraped = scrape_single_url(url, config, page_type_prelim)
-        merged = {**row, **scraped}
-        pages.append(merged)
-        if i < len(serp_results) - 1:
-            time.sleep(REQUEST_DELAY_SECONDS)
-    return pages
+    rows = [row for row in serp_results if row.get("url", "")]
+    if not rows:
+        return []
+    throttle = _DomainThrottle(REQUEST_DELAY_SECONDS)
+
+    with _new_session() as session:
+        def scrape_row(row: dict) -> dict:
+            page_type_prelim = row.get("page_type_prelim", "Service Page")
+            scraped = scrape_single_url(row["url"], config, page_type_prelim, session, throttle)
+            return {**row, **scraped}
+
+        with ThreadPoolExecutor(max_workers=min(SCRAPE_MAX_WORKERS, len(rows))) as executor:
+            return list(executor.map(scrape_row, rows))